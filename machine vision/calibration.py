@@ -0,0 +1,485 @@
+import os
+import sys
+import json
+import hashlib
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import cv2
+
+# 无界面的棋盘格相机标定：多进程并行查找角点，角点按图片内容哈希缓存在磁盘上，
+# 标定集合新增一张图片时只需检测这一张。
+#   python calibration.py 标定图片文件夹 -w 4
+#   python calibration.py 1.bmp 2.bmp ... --rows 23 --cols 17
+#   python calibration.py 标定图片文件夹 --coarse      # 高分辨率图片：缩略图上找棋盘格，原图上亚像素精化
+#   python calibration.py 标定图片文件夹 -o camera.yaml  # 保存标定结果，供 undistort.py 使用
+#   python calibration.py 标定图片文件夹 --incremental   # 逐张加入，结果收敛即停止，剔除误差过大的视图
+
+# 棋盘格内角点的行数和列数
+ROWS = 23
+COLS = 17
+# 角点缓存文件名（放在图片所在文件夹）
+CACHE_FILENAME = '.corner_cache.json'
+# 缓存格式版本：检测逻辑变化时递增，使旧缓存失效
+CACHE_VERSION = 1
+IMAGE_EXTS = ('.bmp', '.png', '.jpg', '.jpeg', '.tif', '.tiff')
+# 由粗到精：长边超过 COARSE_MAX_SIDE 的图片先缩到该尺寸找棋盘格，
+# 再把角点放大回原图，用 cornerSubPix 在原图上精化（窗口半径约为格子边长的 COARSE_WIN_RATIO 倍）
+COARSE_MAX_SIDE = 1600
+COARSE_WIN_RATIO = 0.3
+SUBPIX_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 40, 0.001)
+# 增量标定：至少 MIN_VIEWS 张视图才开始估计；之后每加一张，以上次结果为初值做少量迭代。
+# RMS 变化 < RMS_TOL 像素、fx / fy / cx / cy 相对变化 < PARAM_TOL，且新旧模型（内参 + 畸变系数）
+# 在整幅图像上的投影差 < MODEL_TOL_PX 像素，连续 PATIENCE 次即视为收敛。
+# 畸变系数单看数值不稳定（接近 0 时相对变化无意义），因此按矫正效果在像素上比较；
+# 棋盘格只覆盖图像中部时边角的畸变仍在变化，不会提前判为收敛
+# 单张误差超过 max(中位数 × OUTLIER_FACTOR, OUTLIER_MIN_PX) 的视图被剔除
+MIN_VIEWS = 5
+RMS_TOL = 0.01
+PARAM_TOL = 0.002
+MODEL_TOL_PX = 0.5
+MODEL_GRID = 9
+PATIENCE = 2
+OUTLIER_FACTOR = 3.0
+OUTLIER_MIN_PX = 0.5
+REFINE_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 10, 1e-6)
+
+
+# 文件内容哈希（分块读取）
+def file_digest(path, chunk_size=1 << 20):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# 世界坐标系中的棋盘格角点（z = 0 平面，单位为格）
+def board_object_points(rows=ROWS, cols=COLS):
+    objp = np.zeros((rows * cols, 3), np.float32)
+    objp[:, :2] = np.mgrid[0:cols, 0:rows].T.reshape(-1, 2)
+    return objp
+
+
+# 在缩小的图上找棋盘格，角点映射回原图后亚像素精化；缩略图上没找到时返回 (False, None)
+def _find_corners_coarse(gray, rows, cols):
+    scale = COARSE_MAX_SIDE / float(max(gray.shape))
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    found, corners = cv2.findChessboardCorners(small, (cols, rows), None)
+    if not found:
+        return False, None
+    corners = corners / scale
+    # 相邻角点的最小间距近似格子边长，窗口不能跨过相邻角点
+    grid = corners.reshape(rows, cols, 2)
+    spacing = min(np.linalg.norm(np.diff(grid, axis=1), axis=2).min(),
+                  np.linalg.norm(np.diff(grid, axis=0), axis=2).min())
+    half = int(np.clip(spacing * COARSE_WIN_RATIO, 3, 60))
+    cv2.cornerSubPix(gray, corners, (half, half), (-1, -1), SUBPIX_CRITERIA)
+    return True, corners
+
+
+def detect_corners(path, rows=ROWS, cols=COLS, coarse=False):
+    """返回 {'found', 'corners'（N×1×2 float32 或 None）, 'size'（(w, h)）, 'ms'（检测耗时）}；
+    读图失败时 size 为 None。coarse 为 True 时大图走由粗到精检测，缩略图上失败再回退到原图检测。"""
+    t0 = time.perf_counter()
+    gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        return {'found': False, 'corners': None, 'size': None, 'ms': 0.0}
+    size = (gray.shape[1], gray.shape[0])
+    found = False
+    if coarse and max(gray.shape) > COARSE_MAX_SIDE:
+        found, corners = _find_corners_coarse(gray, rows, cols)
+    if not found:
+        found, corners = cv2.findChessboardCorners(gray, (cols, rows), None)
+    return {'found': bool(found), 'corners': corners if found else None, 'size': size,
+            'ms': round((time.perf_counter() - t0) * 1000.0, 2)}
+
+
+class CornerCache:
+    """按 (文件内容哈希, 棋盘规格, 检测方式) 缓存角点检测结果的 JSON 文件。"""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        if os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == CACHE_VERSION:
+                    self.entries = data.get('entries', {})
+            except (OSError, ValueError):
+                self.entries = {}
+
+    @staticmethod
+    def key_for(path, rows, cols, mode='full'):
+        return f"{file_digest(path)}:{cols}x{rows}:{mode}"
+
+    def get(self, key):
+        e = self.entries.get(key)
+        if e is None:
+            return None
+        corners = np.array(e['corners'], dtype=np.float32).reshape(-1, 1, 2) if e['corners'] else None
+        return {'found': e['found'], 'corners': corners, 'size': tuple(e['size']) if e['size'] else None,
+                'ms': e.get('ms'), 'cached': True}
+
+    def put(self, key, result):
+        corners = result['corners']
+        self.entries[key] = {
+            'found': result['found'],
+            'corners': corners.reshape(-1, 2).tolist() if corners is not None else None,
+            'size': list(result['size']) if result['size'] else None,
+            'ms': result.get('ms'),
+        }
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': CACHE_VERSION, 'entries': self.entries}, f)
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+
+# 查角点缓存：返回 (缓存键, 缓存结果)，未命中时结果为 None；caches 为 文件夹 -> CornerCache
+def _cache_lookup(caches, path, rows, cols, coarse):
+    folder = os.path.dirname(os.path.abspath(path))
+    cache = caches.get(folder)
+    if cache is None:
+        cache = caches[folder] = CornerCache(os.path.join(folder, CACHE_FILENAME))
+    # 不存在的文件不算缓存键，交给 detect_corners 按读图失败处理
+    if not os.path.isfile(path):
+        return None, None
+    key = CornerCache.key_for(path, rows, cols, 'coarse' if coarse else 'full')
+    return key, cache.get(key)
+
+
+def _cache_store(caches, path, key, result):
+    # 读图失败不缓存，下次重试
+    if result['size'] is not None and key is not None:
+        caches[os.path.dirname(os.path.abspath(path))].put(key, result)
+
+
+def detect_all(paths, rows=ROWS, cols=COLS, workers=None, use_cache=True, coarse=False, executor=None):
+    """检测全部图片的角点，结果顺序与 paths 一致，每项多一个 'path'。
+    命中缓存的图片不再检测（结果带 'cached'，'ms' 为当初的检测耗时）；
+    其余图片在进程池中并行检测（workers=1 时串行）。coarse 见 detect_corners。
+    executor：由调用方复用的进程池（多次调用时不必每次新建）。"""
+    paths = list(paths)
+    caches = {}
+    keys = [None] * len(paths)
+    results = [None] * len(paths)
+    if use_cache:
+        for i, p in enumerate(paths):
+            keys[i], results[i] = _cache_lookup(caches, p, rows, cols, coarse)
+    todo = [i for i, r in enumerate(results) if r is None]
+    workers = workers or os.cpu_count() or 1
+    args = ([paths[i] for i in todo], [rows] * len(todo), [cols] * len(todo), [coarse] * len(todo))
+    if executor is not None and len(todo) > 1:
+        detected = list(executor.map(detect_corners, *args))
+    elif workers > 1 and len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(todo))) as own:
+            detected = list(own.map(detect_corners, *args))
+    else:
+        detected = [detect_corners(paths[i], rows, cols, coarse) for i in todo]
+    for i, r in zip(todo, detected):
+        results[i] = r
+        if use_cache:
+            _cache_store(caches, paths[i], keys[i], r)
+    for cache in caches.values():
+        cache.save()
+    for p, r in zip(paths, results):
+        r['path'] = p
+    return results
+
+
+def calibrate(detections, rows=ROWS, cols=COLS):
+    """用找到角点的图片标定，返回 (rms, mtx, dist, rvecs, tvecs)；可用图片为空时返回 None。"""
+    found = [d for d in detections if d['found']]
+    if not found:
+        return None
+    objp = board_object_points(rows, cols)
+    objpoints = [objp] * len(found)
+    imgpoints = [d['corners'] for d in found]
+    return cv2.calibrateCamera(objpoints, imgpoints, found[0]['size'], None, None)
+
+
+# 每张图的重投影误差（像素 RMS），顺序同 calibrate 使用的图片
+def view_errors(detections, rvecs, tvecs, mtx, dist, rows=ROWS, cols=COLS):
+    objp = board_object_points(rows, cols)
+    errors = []
+    for d, rvec, tvec in zip([d for d in detections if d['found']], rvecs, tvecs):
+        projected, _ = cv2.projectPoints(objp, rvec, tvec, mtx, dist)
+        diff = projected.reshape(-1, 2) - d['corners'].reshape(-1, 2)
+        errors.append(float(np.sqrt((diff ** 2).sum(axis=1).mean())))
+    return errors
+
+
+class IncrementalCalibrator:
+    """逐张加入视图的标定器。add_view 返回当前状态 dict：
+    views（参与标定的视图数）、rms、model_shift（新旧模型在整幅图像上的最大投影差，像素）、
+    rejected（本次剔除的视图名）、converged。"""
+
+    def __init__(self, rows=ROWS, cols=COLS, min_views=MIN_VIEWS, rms_tol=RMS_TOL, param_tol=PARAM_TOL,
+                 patience=PATIENCE, outlier_factor=OUTLIER_FACTOR, outlier_min_px=OUTLIER_MIN_PX,
+                 model_tol_px=MODEL_TOL_PX):
+        self.objp = board_object_points(rows, cols)
+        self.min_views = min_views
+        self.rms_tol = rms_tol
+        self.param_tol = param_tol
+        self.model_tol_px = model_tol_px
+        self.patience = patience
+        self.outlier_factor = outlier_factor
+        self.outlier_min_px = outlier_min_px
+        self.names = []
+        self.corners = []
+        self.size = None
+        self.rms = None
+        self.mtx = None
+        self.dist = None
+        self.stable = 0
+        self.rejected = []
+
+    @property
+    def converged(self):
+        return self.stable >= self.patience
+
+    def _calibrate(self):
+        objpoints = [self.objp] * len(self.corners)
+        if self.mtx is None:
+            rms, mtx, dist, rvecs, tvecs = cv2.calibrateCamera(objpoints, self.corners, self.size, None, None)
+        else:
+            # 以上次的内参为初值，只做少量迭代
+            rms, mtx, dist, rvecs, tvecs = cv2.calibrateCamera(
+                objpoints, self.corners, self.size, self.mtx.copy(), self.dist.copy(),
+                flags=cv2.CALIB_USE_INTRINSIC_GUESS, criteria=REFINE_CRITERIA)
+        errors = []
+        for c, rvec, tvec in zip(self.corners, rvecs, tvecs):
+            projected, _ = cv2.projectPoints(self.objp, rvec, tvec, mtx, dist)
+            diff = projected.reshape(-1, 2) - c.reshape(-1, 2)
+            errors.append(float(np.sqrt((diff ** 2).sum(axis=1).mean())))
+        return rms, mtx, dist, errors
+
+    # 新模型下图像网格点（含边角）对应的视线，分别用新旧模型投影回图像，取最大像素差
+    def _model_shift(self, mtx, dist):
+        w, h = self.size
+        xs, ys = np.meshgrid(np.linspace(0, w - 1, MODEL_GRID), np.linspace(0, h - 1, MODEL_GRID))
+        grid = np.stack([xs, ys], axis=-1).reshape(-1, 1, 2)
+        rays = cv2.undistortPoints(grid, mtx, dist).reshape(-1, 2)
+        obj = np.hstack([rays, np.ones((len(rays), 1))])
+        zero = np.zeros(3)
+        old, _ = cv2.projectPoints(obj, zero, zero, self.mtx, self.dist)
+        new, _ = cv2.projectPoints(obj, zero, zero, mtx, dist)
+        return float(np.abs(old - new).max())
+
+    def add_view(self, corners, size, name=None):
+        if self.size is None:
+            self.size = size
+        elif size != self.size:
+            raise ValueError(f"图片尺寸 {size} 与之前的 {self.size} 不一致")
+        self.names.append(name)
+        self.corners.append(corners)
+        state = {'views': len(self.corners), 'rms': self.rms, 'model_shift': None, 'rejected': [],
+                 'converged': self.converged}
+        if len(self.corners) < self.min_views:
+            return state
+
+        rms, mtx, dist, errors = self._calibrate()
+        # 剔除离群视图后重新估计；剩余视图不少于 min_views
+        limit = max(float(np.median(errors)) * self.outlier_factor, self.outlier_min_px)
+        bad = [i for i, e in enumerate(errors) if e > limit]
+        if bad and len(self.corners) - len(bad) >= self.min_views:
+            state['rejected'] = [self.names[i] for i in bad]
+            self.rejected.extend(state['rejected'])
+            keep = [i for i in range(len(self.corners)) if i not in bad]
+            self.names = [self.names[i] for i in keep]
+            self.corners = [self.corners[i] for i in keep]
+            rms, mtx, dist, errors = self._calibrate()
+
+        if self.mtx is not None:
+            old = np.array([self.mtx[0, 0], self.mtx[1, 1], self.mtx[0, 2], self.mtx[1, 2]])
+            new = np.array([mtx[0, 0], mtx[1, 1], mtx[0, 2], mtx[1, 2]])
+            param_delta = float(np.max(np.abs(new - old) / np.abs(old)))
+            state['model_shift'] = self._model_shift(mtx, dist)
+            if (abs(rms - self.rms) < self.rms_tol and param_delta < self.param_tol
+                    and state['model_shift'] < self.model_tol_px and not state['rejected']):
+                self.stable += 1
+            else:
+                self.stable = 0
+        self.rms, self.mtx, self.dist = rms, mtx, dist
+        state.update(views=len(self.corners), rms=rms, converged=self.converged)
+        return state
+
+
+def calibrate_incremental(paths, rows=ROWS, cols=COLS, workers=None, use_cache=True, coarse=False,
+                          calibrator=None, on_step=None):
+    """按顺序检测并逐张加入 IncrementalCalibrator，收敛后不再检测剩余图片。
+    检测在进程池中滚动进行：始终只有 workers 张图片在检测，每用掉一张再提交下一张，
+    收敛时取消尚未开始的检测（已在进行的检测结果仍写入缓存）。
+    on_step(path, state) 在每张找到角点的图片加入后调用。
+    返回 (calibrator, 实际运行检测的图片数)，命中缓存的图片不计入。"""
+    calibrator = calibrator or IncrementalCalibrator(rows, cols)
+    paths = list(paths)
+    window = workers or os.cpu_count() or 1
+    executor = ProcessPoolExecutor(max_workers=window) if window > 1 and len(paths) > 1 else None
+    caches = {}
+    pending = deque()  # (路径, 缓存键, 缓存结果, future)
+    remaining = iter(paths)
+    submitted = 0
+
+    def fill():
+        nonlocal submitted
+        while len(pending) < window:
+            p = next(remaining, None)
+            if p is None:
+                return
+            key, cached = _cache_lookup(caches, p, rows, cols, coarse) if use_cache else (None, None)
+            fut = None
+            if cached is None and executor is not None:
+                fut = executor.submit(detect_corners, p, rows, cols, coarse)
+                submitted += 1
+            pending.append((p, key, cached, fut))
+
+    try:
+        fill()
+        while pending:
+            p, key, d, fut = pending.popleft()
+            if d is None:
+                if fut is not None:
+                    d = fut.result()
+                else:
+                    d = detect_corners(p, rows, cols, coarse)
+                    submitted += 1
+                if use_cache:
+                    _cache_store(caches, p, key, d)
+            fill()
+            d['path'] = p
+            if not d['found']:
+                continue
+            state = calibrator.add_view(d['corners'], d['size'], d['path'])
+            if on_step is not None:
+                on_step(d['path'], state)
+            if state['converged']:
+                break
+    finally:
+        for _, _, _, fut in pending:
+            if fut is not None and fut.cancel():
+                submitted -= 1
+        if executor is not None:
+            executor.shutdown()
+        # 收敛时已在进行的检测也跑完了，结果留给下次
+        for p, key, _, fut in pending:
+            if use_cache and fut is not None and not fut.cancelled() and fut.exception() is None:
+                _cache_store(caches, p, key, fut.result())
+        for cache in caches.values():
+            cache.save()
+    return calibrator, submitted
+
+
+# 标定结果保存为 OpenCV FileStorage 文件（.yaml / .yml / .xml / .json，按扩展名）
+def save_calibration(path, mtx, dist, image_size, rms=None):
+    fs = cv2.FileStorage(path, cv2.FILE_STORAGE_WRITE)
+    fs.write('image_width', int(image_size[0]))
+    fs.write('image_height', int(image_size[1]))
+    fs.write('camera_matrix', np.asarray(mtx, dtype=np.float64))
+    fs.write('dist_coeffs', np.asarray(dist, dtype=np.float64).reshape(1, -1))
+    if rms is not None:
+        fs.write('rms', float(rms))
+    fs.release()
+
+
+def load_calibration(path):
+    """返回 {'camera_matrix', 'dist_coeffs', 'image_size'（(w, h)）, 'rms'（可能为 None）}。"""
+    fs = cv2.FileStorage(path, cv2.FILE_STORAGE_READ)
+    if not fs.isOpened():
+        raise IOError(f"无法读取标定文件：{path}")
+    try:
+        mtx = fs.getNode('camera_matrix').mat()
+        dist = fs.getNode('dist_coeffs').mat()
+        if mtx is None or dist is None:
+            raise ValueError(f"标定文件缺少 camera_matrix / dist_coeffs：{path}")
+        size = (int(fs.getNode('image_width').real()), int(fs.getNode('image_height').real()))
+        rms_node = fs.getNode('rms')
+        rms = None if rms_node.empty() else rms_node.real()
+    finally:
+        fs.release()
+    return {'camera_matrix': mtx, 'dist_coeffs': dist, 'image_size': size, 'rms': rms}
+
+
+def list_images(folder):
+    return sorted(os.path.join(folder, n) for n in os.listdir(folder) if n.lower().endswith(IMAGE_EXTS))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="棋盘格相机标定（无界面，并行检测 + 角点缓存）")
+    parser.add_argument('inputs', nargs='+', help="标定图片，或包含标定图片的文件夹")
+    parser.add_argument('--rows', type=int, default=ROWS, help=f"棋盘格内角点行数（默认 {ROWS}）")
+    parser.add_argument('--cols', type=int, default=COLS, help=f"棋盘格内角点列数（默认 {COLS}）")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="检测进程数（默认 CPU 核数）")
+    parser.add_argument('--no-cache', action='store_true', help="不读写角点缓存")
+    parser.add_argument('--coarse', action='store_true',
+                        help=f"长边超过 {COARSE_MAX_SIDE} 的图片先在缩略图上找棋盘格，再在原图上亚像素精化")
+    parser.add_argument('-o', '--output', metavar='PATH', help="标定结果保存路径（.yaml / .xml）")
+    parser.add_argument('--incremental', action='store_true',
+                        help="逐张加入视图，RMS、内参与畸变收敛后提前停止，并剔除误差过大的视图")
+    args = parser.parse_args()
+
+    paths = []
+    for p in args.inputs:
+        paths.extend(list_images(p) if os.path.isdir(p) else [p])
+
+    if args.incremental:
+        def report(path, state):
+            rms = '-' if state['rms'] is None else f"{state['rms']:.4f}"
+            shift = '' if state['model_shift'] is None else f"  模型变化 {state['model_shift']:.2f} 像素"
+            rejected = f"  剔除 {', '.join(os.path.basename(r) for r in state['rejected'])}" if state['rejected'] else ''
+            print(f"{os.path.basename(path)}: 视图 {state['views']}  RMS {rms}{shift}{rejected}"
+                  f"{'  已收敛' if state['converged'] else ''}")
+        calib, used = calibrate_incremental(paths, args.rows, args.cols, workers=args.workers,
+                                            use_cache=not args.no_cache, coarse=args.coarse, on_step=report)
+        if calib.mtx is None:
+            print("标定失败：找到角点的图片不足")
+            sys.exit(1)
+        print(f"\n共 {len(paths)} 张，运行检测 {used} 张，使用 {len(calib.corners)} 个视图，剔除 {len(calib.rejected)} 个"
+              f"{'，已收敛' if calib.converged else '，未收敛'}")
+        print(f"重投影误差 (RMS): {calib.rms:.4f} 像素")
+        print("相机矩阵:")
+        print(calib.mtx)
+        print("\n畸变系数:")
+        print(calib.dist)
+        if args.output:
+            save_calibration(args.output, calib.mtx, calib.dist, calib.size, calib.rms)
+            print(f"\n标定结果已保存：{args.output}")
+        sys.exit(0)
+    detections = detect_all(paths, args.rows, args.cols, workers=args.workers, use_cache=not args.no_cache,
+                            coarse=args.coarse)
+    result = calibrate(detections, args.rows, args.cols)
+    errors = iter(view_errors(detections, result[3], result[4], result[1], result[2], args.rows, args.cols)
+                  if result is not None else [])
+    for d in detections:
+        ms = '-' if d.get('ms') is None else f"{d['ms']:.1f} ms"
+        note = '（缓存）' if d.get('cached') else ''
+        err = f"  重投影误差 {next(errors):.4f} 像素" if d['found'] else ''
+        found = '找到角点' if d['found'] else ('无法读取图片' if d['size'] is None else '未找到角点')
+        print(f"{os.path.basename(d['path'])}: {found}  "
+              f"检测 {ms}{note}{err}")
+    if result is None:
+        print("标定失败：没有找到角点的图片")
+        sys.exit(1)
+    rms, mtx, dist, _, _ = result
+    print(f"\n重投影误差 (RMS): {rms:.4f} 像素")
+    print("相机矩阵:")
+    print(mtx)
+    print("\n畸变系数:")
+    print(dist)
+    if args.output:
+        size = next(d['size'] for d in detections if d['found'])
+        save_calibration(args.output, mtx, dist, size, rms)
+        print(f"\n标定结果已保存：{args.output}")
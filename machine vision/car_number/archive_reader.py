@@ -0,0 +1,92 @@
+import queue
+import tarfile
+import zipfile
+import threading
+
+from plate_config import IMAGE_EXTS
+
+# 直接从 zip / tar 压缩包读取图片，不解压到磁盘。
+# 成员内容读入内存后交给 cv2.imdecode；后台线程预读，读包与识别同时进行。
+
+ARCHIVE_EXTS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+# 预读队列最多缓存的成员数（内存占用约为 PREFETCH_DEPTH 张图片）
+PREFETCH_DEPTH = 32
+
+
+def is_archive(path):
+    return path.lower().endswith(ARCHIVE_EXTS)
+
+
+class ArchiveMember:
+    """压缩包中的一张图片：name 为包内路径，data 为文件字节。"""
+    __slots__ = ('name', 'data')
+
+    def __init__(self, name, data):
+        self.name = name
+        self.data = data
+
+
+# 按包内存储顺序逐个读取图片成员
+def iter_archive_members(archive_path):
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as zf:
+            for info in zf.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTS):
+                    yield ArchiveMember(info.filename, zf.read(info))
+        return
+    # 流式模式（r|*）顺序解压，压缩的 tar 也不需要回退定位
+    with tarfile.open(archive_path, 'r|*') as tf:
+        for info in tf:
+            if info.isfile() and info.name.lower().endswith(IMAGE_EXTS):
+                f = tf.extractfile(info)
+                yield ArchiveMember(info.name, f.read())
+
+
+def prefetch(iterable, depth=PREFETCH_DEPTH):
+    """在后台线程中提前迭代 iterable，最多领先 depth 个元素；后台的异常在取到该位置时抛出。"""
+    q = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        # 消费方提前结束时不再阻塞在满队列上
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def run():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+        except Exception as e:
+            put((done, e))
+            return
+        finally:
+            # 提前结束时关闭底层生成器，及时释放压缩包文件句柄
+            close = getattr(iterable, 'close', None)
+            if close is not None:
+                close()
+        put((done, None))
+
+    t = threading.Thread(target=run, name='archive-prefetch', daemon=True)
+    t.start()
+    try:
+        while True:
+            item, err = q.get()
+            if item is done:
+                if err is not None:
+                    raise err
+                return
+            yield item
+    finally:
+        stop.set()
+        t.join()
+
+
+def iter_archive_images(archive_path, depth=PREFETCH_DEPTH):
+    return prefetch(iter_archive_members(archive_path), depth)
@@ -0,0 +1,216 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import numpy as np
+import cv2
+
+import plate_recognition as pr
+
+# 车牌识别流水线分阶段基准测试：
+#   python benchmark.py [图片文件夹] -o result.json
+#   python benchmark.py [图片文件夹] --compare baseline.json --threshold 0.1
+# 不给文件夹时使用合成图片（随机背景 + 渲染的蓝底白字车牌）。
+
+SYNTH_COUNT = 20
+SYNTH_SIZE = (720, 1280)
+
+
+# 合成测试图：固定随机种子，保证多次运行输入一致
+def make_synthetic_corpus(folder, count=SYNTH_COUNT, size=SYNTH_SIZE, seed=0):
+    rng = np.random.default_rng(seed)
+    h, w = size
+    letters = 'ABCDEFGHJKLMNPQRSTUVWXYZ'
+    paths = []
+    for i in range(count):
+        img = rng.integers(0, 256, (h, w, 3), dtype=np.uint8)
+        img = cv2.GaussianBlur(img, (0, 0), 5)
+        pw, ph = 220, 70
+        x = int(rng.integers(0, w - pw))
+        y = int(rng.integers(h // 3, h - ph))
+        cv2.rectangle(img, (x, y), (x + pw, y + ph), (160, 60, 10), -1)
+        text = letters[i % len(letters)] + ''.join(str(d) for d in rng.integers(0, 10, 5))
+        cv2.putText(img, text, (x + 12, y + 50), cv2.FONT_HERSHEY_SIMPLEX, 1.4, (255, 255, 255), 3)
+        p = os.path.join(folder, f'synth_{i:03d}.jpg')
+        cv2.imwrite(p, img)
+        paths.append(p)
+    return paths
+
+
+def list_images(folder):
+    return sorted(os.path.join(folder, n) for n in os.listdir(folder)
+                  if n.lower().endswith(pr.IMAGE_EXTS))
+
+
+class StageRecorder:
+    """按阶段名累计耗时（毫秒）与分配量（KB，tracemalloc 峰值）。"""
+
+    def __init__(self, track_alloc=False):
+        self.track_alloc = track_alloc
+        self.times = {}
+        self.allocs = {}
+
+    def run(self, name, fn, *args, **kwargs):
+        if self.track_alloc:
+            base, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            out = fn(*args, **kwargs)
+            _, peak = tracemalloc.get_traced_memory()
+            self.allocs.setdefault(name, []).append((peak - base) / 1024.0)
+            return out
+        t0 = time.perf_counter()
+        out = fn(*args, **kwargs)
+        self.times.setdefault(name, []).append((time.perf_counter() - t0) * 1000.0)
+        return out
+
+
+# 按 recognize_image 的顺序逐阶段执行一张图片
+def run_stages(rec, path):
+    image = rec.run('imread', cv2.imread, path)
+    if image is None:
+        return
+
+    def enhance():
+        c = pr.PlateImageContext(image)
+        c.enhance()
+        return c
+    ctx = rec.run('enhance_image_for_plate', enhance)
+    enhanced = ctx.enhanced
+    candidates = []
+    for scale in pr.DEFAULT_SCALES:
+        def detect(scale=scale):
+            resized = enhanced if scale == 1.0 else cv2.resize(enhanced, (0, 0), fx=scale, fy=scale)
+            return pr.HyperLPR_plate_recognition(resized) or []
+        for r in rec.run(f'hyperlpr_scale_{scale}', detect):
+            candidates.append({'plate': r[0], 'conf': r[1], 'bbox': r[2] if len(r) > 2 else None,
+                               'scale': scale})
+    if not candidates:
+        return
+    plates = rec.run('postprocess', pr.merge_plate_candidates, candidates, enhanced.shape)
+    if not plates:
+        return
+    rec.run('classify_plate', pr._classify_plate, ctx, plates[0]['plate'], plates[0]['bbox'])
+
+
+def run_benchmark(paths, folder, repeat=3, track_alloc=True):
+    pr.DEBUG = False
+    # 不写 debug_outputs：既不污染固定测试文件夹，后台写盘线程也不与计时代码争抢 CPU
+    pr.SAVE_DEBUG_IMAGES = False
+    # 预热：模型加载、首次调用的惰性初始化不计入
+    for p in paths[:1]:
+        pr.recognize_plate(p)
+
+    rec = StageRecorder()
+    for _ in range(repeat):
+        for p in paths:
+            run_stages(rec, p)
+            rec.run('recognize_plate', pr.recognize_plate, p)
+        # 批处理开销 = batch_process 总耗时 - 各图 recognize_plate 耗时之和（不使用缓存）；
+        # 单图调用不带调度器、跑完全部尺度，批处理也关闭提前结束（conf_threshold=None），两边工作量一致
+        t0 = time.perf_counter()
+        pr.batch_process(folder, use_cache=False, conf_threshold=None)
+        total = (time.perf_counter() - t0) * 1000.0
+        per_image = rec.times['recognize_plate'][-len(paths):]
+        rec.times.setdefault('batch_process_overhead', []).append(
+            max(0.0, total - sum(per_image)) / len(paths))
+
+    if track_alloc:
+        tracemalloc.start()
+        rec.track_alloc = True
+        for p in paths:
+            run_stages(rec, p)
+            rec.run('recognize_plate', pr.recognize_plate, p)
+        tracemalloc.stop()
+
+    stages = {}
+    for name, ts in rec.times.items():
+        arr = np.array(ts)
+        stages[name] = {
+            'count': int(arr.size),
+            'mean_ms': round(float(arr.mean()), 4),
+            'min_ms': round(float(arr.min()), 4),
+            'p50_ms': round(float(np.percentile(arr, 50)), 4),
+            'p95_ms': round(float(np.percentile(arr, 95)), 4),
+            'total_ms': round(float(arr.sum()), 4),
+        }
+    for name, al in rec.allocs.items():
+        stages.setdefault(name, {})['alloc_kb_mean'] = round(float(np.mean(al)), 2)
+    return {
+        'meta': {
+            'images': len(paths),
+            'repeat': repeat,
+            'pipeline_version': pr.PIPELINE_VERSION,
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        },
+        'stages': stages,
+    }
+
+
+# 对比：任一阶段耗时中位数（或平均分配量）比基线增加超过 threshold，且绝对增量超过下限即视为退化。
+# 平均值易被偶发的调度抖动拉高，亚毫秒级阶段的相对变化也多是噪声，故用中位数并设绝对下限
+COMPARE_FLOORS = {'p50_ms': 0.5, 'alloc_kb_mean': 16.0}
+
+
+def compare(current, baseline, threshold=0.10, floors=None):
+    floors = dict(COMPARE_FLOORS, **(floors or {}))
+    regressions = []
+    for name, cur in current['stages'].items():
+        base = baseline.get('stages', {}).get(name)
+        if not base:
+            continue
+        for key in ('p50_ms', 'alloc_kb_mean'):
+            if key in cur and base.get(key):
+                delta = cur[key] - base[key]
+                change = delta / base[key]
+                if change > threshold and delta > floors[key]:
+                    regressions.append((name, key, base[key], cur[key], change))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="车牌识别流水线分阶段基准测试")
+    parser.add_argument('folder', nargs='?', help="固定的测试图片文件夹（默认生成合成图片）")
+    parser.add_argument('-r', '--repeat', type=int, default=3, help="计时轮数（默认 3）")
+    parser.add_argument('--no-alloc', action='store_true', help="不统计内存分配")
+    parser.add_argument('-o', '--output', help="结果 JSON 输出路径（默认打印到标准输出）")
+    parser.add_argument('--compare', help="基线 JSON；有阶段退化超过阈值时返回码为 1")
+    parser.add_argument('--threshold', type=float, default=0.10, help="退化阈值（默认 0.10，即 10%%）")
+    parser.add_argument('--floor-ms', type=float, default=COMPARE_FLOORS['p50_ms'],
+                        help=f"耗时退化的绝对下限，单位毫秒（默认 {COMPARE_FLOORS['p50_ms']}）")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.folder:
+            folder = args.folder
+            paths = list_images(folder)
+        else:
+            folder = tmp
+            paths = make_synthetic_corpus(tmp)
+        if not paths:
+            print("未找到图片文件！")
+            sys.exit(2)
+        result = run_benchmark(paths, folder, repeat=args.repeat, track_alloc=not args.no_alloc)
+
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.threshold, {'p50_ms': args.floor_ms})
+        for name, key, old, new, change in regressions:
+            print(f"退化: {name}.{key} {old} -> {new} (+{change:.1%})", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("无阶段退化", file=sys.stderr)
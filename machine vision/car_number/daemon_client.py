@@ -0,0 +1,171 @@
+import os
+import sys
+import json
+import time
+import socket
+import tempfile
+import threading
+import subprocess
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from plate_config import IMAGE_EXTS
+
+# main.py --daemon 的客户端：只用标准库，不加载 OpenCV 与模型。
+# 第一次调用时在后台启动 service.py（监听本地 Unix 套接字，模型常驻进程池），
+# 之后的每次命令行调用直接连上已预热的服务，省去导入与模型加载的时间。
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+SERVICE_SCRIPT = os.path.join(current_dir, 'service.py')
+
+# 没有 Unix 套接字的平台（Windows）改用本机 TCP 端口
+if hasattr(socket, 'AF_UNIX') and hasattr(os, 'getuid'):
+    DEFAULT_ADDRESS = os.path.join(tempfile.gettempdir(), f'car_number-{os.getuid()}.sock')
+else:
+    DEFAULT_ADDRESS = ('127.0.0.1', 8765)
+# 等待新启动的服务就绪的最长秒数（包含模型加载）
+START_TIMEOUT = 120
+# 同时在途的请求数：服务端把它们合并成批次送入 worker
+DEFAULT_CONCURRENCY = 8
+# 服务端输出写到这个日志文件，便于排查启动失败
+LOG_PATH = os.path.join(tempfile.gettempdir(), 'car_number-daemon.log')
+
+
+class DaemonConnection:
+    """到识别服务的一条 keep-alive HTTP 连接。"""
+
+    def __init__(self, address=DEFAULT_ADDRESS, timeout=None):
+        if isinstance(address, str):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(address)
+        self.f = self.sock.makefile('rb')
+
+    def request(self, method, path, payload=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8') if payload is not None else b''
+        head = (f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                f"Connection: keep-alive\r\n\r\n").encode('latin-1')
+        self.sock.sendall(head + body)
+        status_line = self.f.readline()
+        if not status_line:
+            raise ConnectionError('识别服务关闭了连接')
+        length = 0
+        while True:
+            h = self.f.readline()
+            if h in (b'\r\n', b'\n', b''):
+                break
+            k, _, v = h.decode('latin-1').partition(':')
+            if k.strip().lower() == 'content-length':
+                length = int(v.strip())
+        data = json.loads(self.f.read(length).decode('utf-8')) if length else {}
+        if b' 200 ' not in status_line:
+            raise RuntimeError(data.get('error') or status_line.decode('latin-1').strip())
+        return data
+
+    def close(self):
+        self.f.close()
+        self.sock.close()
+
+
+# 服务在运行时返回 /health 的内容，否则返回 None
+def ping(address=DEFAULT_ADDRESS):
+    try:
+        conn = DaemonConnection(address, timeout=2.0)
+    except OSError:
+        return None
+    try:
+        return conn.request('GET', '/health')
+    except (OSError, ValueError, RuntimeError):
+        return None
+    finally:
+        conn.close()
+
+
+def start_daemon(address=DEFAULT_ADDRESS, workers=None, conf_threshold=None, timeout=START_TIMEOUT):
+    cmd = [sys.executable, SERVICE_SCRIPT]
+    if isinstance(address, str):
+        # 上次异常退出留下的套接字文件会让监听失败
+        if os.path.exists(address):
+            os.remove(address)
+        cmd += ['--unix', address]
+    else:
+        cmd += ['--host', address[0], '--port', str(address[1])]
+    if workers:
+        cmd += ['-w', str(workers)]
+    if conf_threshold is None:
+        cmd.append('--all-scales')
+    else:
+        cmd += ['--conf-threshold', str(conf_threshold)]
+    with open(LOG_PATH, 'ab') as log:
+        # 新会话：命令行进程退出或 Ctrl+C 时服务不受影响
+        proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=log, stderr=log,
+                                cwd=current_dir, start_new_session=True)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        info = ping(address)
+        if info is not None:
+            return info
+        if proc.poll() is not None:
+            break
+        time.sleep(0.1)
+    raise RuntimeError(f"识别服务启动失败，详见 {LOG_PATH}")
+
+
+def ensure_daemon(address=DEFAULT_ADDRESS, workers=None, conf_threshold=None):
+    """返回 (服务信息, 是否本次新启动)。已在运行的服务沿用其启动时的参数。"""
+    info = ping(address)
+    if info is not None:
+        return info, False
+    return start_daemon(address, workers, conf_threshold), True
+
+
+def stop_daemon(address=DEFAULT_ADDRESS):
+    try:
+        conn = DaemonConnection(address, timeout=5.0)
+    except OSError:
+        return False
+    try:
+        conn.request('POST', '/shutdown')
+        return True
+    finally:
+        conn.close()
+
+
+def _scan_images(folder_path):
+    with os.scandir(folder_path) as it:
+        for entry in it:
+            if entry.name.lower().endswith(IMAGE_EXTS) and entry.is_file():
+                yield entry.path
+
+
+def iter_daemon(folder_path, address=DEFAULT_ADDRESS, concurrency=DEFAULT_CONCURRENCY, options=None):
+    """把文件夹中的图片逐张发给服务识别，按扫描顺序逐条产出结果行。
+    同时在途的请求不超过 concurrency 个，每个线程复用自己的连接。"""
+    local = threading.local()
+    conns = []
+
+    def recognize(path):
+        conn = getattr(local, 'conn', None)
+        if conn is None:
+            conn = local.conn = DaemonConnection(address)
+            conns.append(conn)
+        return conn.request('POST', '/recognize', {'path': os.path.abspath(path), 'options': options})
+
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        try:
+            for path in _scan_images(folder_path):
+                pending.append(executor.submit(recognize, path))
+                if len(pending) >= concurrency * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for fut in pending:
+                fut.cancel()
+            executor.shutdown(wait=True)
+            for conn in conns:
+                conn.close()
@@ -0,0 +1,103 @@
+import os
+import zlib
+import queue
+import threading
+from multiprocessing import util
+import cv2
+
+# 默认：队列最多缓存 64 组图片，且排队图像的像素数据合计不超过 256MB（4K 帧一组约 50MB，
+# 只按组数限制会积压数 GB）；每个调试目录最多 500MB；全部保存（采样率 1.0）
+DEFAULT_QUEUE_SIZE = 64
+DEFAULT_QUEUE_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_BYTES = 500 * 1024 * 1024
+DEFAULT_SAMPLE_RATE = 1.0
+
+
+class DebugImageWriter:
+    """后台线程写调试图片。识别循环里 submit 只入队，不做编码与磁盘 I/O；
+    队列满（组数或字节数超限）、未被采样或目录超过上限时直接丢弃，保证不拖慢识别。"""
+
+    def __init__(self, queue_size=DEFAULT_QUEUE_SIZE, max_bytes=DEFAULT_MAX_BYTES,
+                 sample_rate=DEFAULT_SAMPLE_RATE, queue_bytes=DEFAULT_QUEUE_BYTES):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.queue_bytes = queue_bytes
+        self.queued_bytes = 0
+        self.lock = threading.Lock()
+        self.max_bytes = max_bytes
+        self.sample_rate = sample_rate
+        self.dir_sizes = {}
+        self.written = 0
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._run, name='debug-image-writer', daemon=True)
+        self.thread.start()
+        # 进程池 worker 退出时不会执行 atexit，用 multiprocessing 的 Finalize 保证队列写完
+        util.Finalize(self, self.close, exitpriority=10)
+
+    # 按文件名哈希采样：同一张图片每次运行的取舍一致
+    def _sampled(self, name):
+        if self.sample_rate >= 1.0:
+            return True
+        return (zlib.crc32(name.encode('utf-8')) % 10000) < self.sample_rate * 10000
+
+    def submit(self, dbg_dir, base, images):
+        """images: [(后缀, BGR 图像), ...]，写为 dbg_dir/base+后缀.jpg"""
+        if not self._sampled(base):
+            return False
+        nbytes = sum(img.nbytes for _, img in images)
+        with self.lock:
+            # 队列为空时总能放入一组，单组超过上限的图片也不会永远写不出
+            if self.queued_bytes and self.queued_bytes + nbytes > self.queue_bytes:
+                self.dropped += 1
+                return False
+            try:
+                self.queue.put_nowait((dbg_dir, base, images, nbytes))
+            except queue.Full:
+                self.dropped += 1
+                return False
+            self.queued_bytes += nbytes
+        return True
+
+    def _dir_size(self, dbg_dir):
+        size = self.dir_sizes.get(dbg_dir)
+        if size is None:
+            size = 0
+            if os.path.isdir(dbg_dir):
+                with os.scandir(dbg_dir) as it:
+                    for entry in it:
+                        if entry.is_file():
+                            size += entry.stat().st_size
+        return size
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                dbg_dir, base, images, nbytes = item
+                with self.lock:
+                    self.queued_bytes -= nbytes
+                size = self._dir_size(dbg_dir)
+                if self.max_bytes is not None and size >= self.max_bytes:
+                    self.dropped += 1
+                    continue
+                os.makedirs(dbg_dir, exist_ok=True)
+                for suffix, img in images:
+                    p = os.path.join(dbg_dir, base + suffix + '.jpg')
+                    if cv2.imwrite(p, img):
+                        size += os.path.getsize(p)
+                self.dir_sizes[dbg_dir] = size
+                self.written += 1
+            except Exception:
+                self.dropped += 1
+            finally:
+                self.queue.task_done()
+
+    # 等待已入队的图片全部写完
+    def flush(self):
+        self.queue.join()
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
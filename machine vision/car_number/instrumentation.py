@@ -0,0 +1,107 @@
+import json
+import time
+from contextlib import nullcontext
+
+# 耗时直方图的桶上界（毫秒），最后一个桶收集所有更慢的样本
+HIST_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+# 未开启记录时各阶段共用的空上下文，开销只有一次函数调用
+_NO_SPAN = nullcontext()
+
+
+class _Span:
+    __slots__ = ('trace', 'name', 't0')
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        ms = (time.perf_counter() - self.t0) * 1000.0
+        stages = self.trace.stages
+        stages[self.name] = stages.get(self.name, 0.0) + ms
+        return False
+
+
+class Trace:
+    """单张图片的记录：各阶段耗时（毫秒）、计数（尺度命中、回退等）与失败原因。"""
+    __slots__ = ('stages', 'counters', 'failure')
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self.failure = None
+
+    def stage(self, name):
+        return _Span(self, name)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def fail(self, reason):
+        self.failure = reason
+
+    def to_dict(self):
+        return {'stages': self.stages, 'counters': self.counters, 'failure': self.failure}
+
+
+# trace 可能为 None（未开启），调用方统一写 with span(trace, '阶段名'):
+def span(trace, name):
+    return trace.stage(name) if trace is not None else _NO_SPAN
+
+
+class TraceAggregator:
+    """汇总各图片的 Trace：逐条写 JSONL 事件，结束时追加一条汇总（各阶段直方图、计数、失败原因）。"""
+
+    def __init__(self, jsonl_path=None):
+        self.f = open(jsonl_path, 'a', encoding='utf-8') if jsonl_path else None
+        self.images = 0
+        self.hist = {}
+        self.stage_total = {}
+        self.counters = {}
+        self.failures = {}
+
+    def add(self, image, trace):
+        self.images += 1
+        for name, ms in trace['stages'].items():
+            buckets = self.hist.get(name)
+            if buckets is None:
+                buckets = self.hist[name] = [0] * (len(HIST_BUCKETS_MS) + 1)
+            i = 0
+            while i < len(HIST_BUCKETS_MS) and ms > HIST_BUCKETS_MS[i]:
+                i += 1
+            buckets[i] += 1
+            self.stage_total[name] = self.stage_total.get(name, 0.0) + ms
+        for name, n in trace['counters'].items():
+            self.counters[name] = self.counters.get(name, 0) + n
+        if trace['failure']:
+            self.failures[trace['failure']] = self.failures.get(trace['failure'], 0) + 1
+        if self.f is not None:
+            event = {'event': 'image', 'image': image, 'ts': time.time()}
+            event.update(trace)
+            self.f.write(json.dumps(event, ensure_ascii=False) + '\n')
+
+    def summary(self):
+        labels = [f'<={b}ms' for b in HIST_BUCKETS_MS] + [f'>{HIST_BUCKETS_MS[-1]}ms']
+        stages = {}
+        for name, buckets in self.hist.items():
+            n = sum(buckets)
+            stages[name] = {
+                'count': n,
+                'mean_ms': round(self.stage_total[name] / n, 3) if n else 0.0,
+                'histogram': {l: c for l, c in zip(labels, buckets) if c},
+            }
+        return {'event': 'summary', 'images': self.images, 'stages': stages,
+                'counters': self.counters, 'failures': self.failures}
+
+    def close(self):
+        summary = self.summary()
+        if self.f is not None:
+            self.f.write(json.dumps(summary, ensure_ascii=False) + '\n')
+            self.f.close()
+            self.f = None
+        return summary
@@ -0,0 +1,102 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+# service.py 的压测工具：多个并发连接（keep-alive）持续发送识别请求，
+# 统计每秒请求数与延迟分位数。
+#   python loadgen.py data_jpg/001.jpg -c 16 -n 500
+#   python loadgen.py data_jpg/001.jpg --path-mode     # 只发送路径，服务端自行读取
+
+
+async def _client(reader, writer, host, request_body, content_type, latencies, remaining, errors):
+    head = (f"POST /recognize HTTP/1.1\r\nHost: {host}\r\n"
+            f"Content-Type: {content_type}\r\nContent-Length: {len(request_body)}\r\n"
+            f"Connection: keep-alive\r\n\r\n").encode('latin-1')
+    while remaining[0] > 0:
+        remaining[0] -= 1
+        t0 = time.perf_counter()
+        writer.write(head + request_body)
+        await writer.drain()
+        status_line = await reader.readline()
+        if not status_line:
+            errors.append('连接被关闭')
+            return
+        length = 0
+        while True:
+            h = await reader.readline()
+            if h in (b'\r\n', b'\n', b''):
+                break
+            k, _, v = h.decode('latin-1').partition(':')
+            if k.strip().lower() == 'content-length':
+                length = int(v.strip())
+        await reader.readexactly(length)
+        latencies.append(time.perf_counter() - t0)
+        if b' 200 ' not in status_line:
+            errors.append(status_line.decode('latin-1').strip())
+
+
+async def run_load(image, concurrency=8, total=200, host='127.0.0.1', port=8765, unix_path=None,
+                   path_mode=False):
+    if path_mode:
+        body = json.dumps({'path': os.path.abspath(image)}).encode('utf-8')
+        ctype = 'application/json'
+    else:
+        with open(image, 'rb') as f:
+            body = f.read()
+        ctype = 'image/jpeg'
+
+    conns = []
+    for _ in range(concurrency):
+        if unix_path:
+            conns.append(await asyncio.open_unix_connection(unix_path))
+        else:
+            conns.append(await asyncio.open_connection(host, port))
+
+    latencies, errors = [], []
+    remaining = [total]
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_client(r, w, host, body, ctype, latencies, remaining, errors)
+                           for r, w in conns))
+    elapsed = time.perf_counter() - t0
+    for _, w in conns:
+        w.close()
+
+    latencies.sort()
+
+    def pct(p):
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, int(round(p / 100.0 * (len(latencies) - 1))))] * 1000.0
+
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'concurrency': concurrency,
+        'elapsed_s': round(elapsed, 3),
+        'rps': round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+        'p50_ms': round(pct(50), 2),
+        'p95_ms': round(pct(95), 2),
+        'p99_ms': round(pct(99), 2),
+        'max_ms': round(latencies[-1] * 1000.0, 2) if latencies else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="车牌识别服务压测")
+    parser.add_argument('image', help="用于压测的图片")
+    parser.add_argument('-c', '--concurrency', type=int, default=8, help="并发连接数（默认 8）")
+    parser.add_argument('-n', '--requests', type=int, default=200, help="总请求数（默认 200）")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', metavar='PATH', help="连接 Unix 套接字")
+    parser.add_argument('--path-mode', action='store_true', help="发送图片路径而不是图片字节")
+    args = parser.parse_args()
+    if not os.path.exists(args.image):
+        print("文件不存在")
+        sys.exit(1)
+    result = asyncio.run(run_load(args.image, args.concurrency, args.requests, args.host, args.port,
+                                  args.unix, args.path_mode))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
@@ -1,5 +1,9 @@
+import time
+T_START = time.perf_counter()
 import os
 import sys
+import argparse
+import functools
 import unicodedata
 import os.path
 
@@ -7,14 +11,133 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 plate_dir = current_dir
 sys.path.append(plate_dir)
 
-from plate_recognition import *
+# 这里只导入标准库与参数常量：--help、参数错误立即返回；
+# OpenCV 与识别模型在解析完参数、确实需要本地识别时才加载（--daemon 模式完全不加载）
+from plate_config import SCALE_CONF_THRESHOLD, COARSE_MIN_WIDTH, TILE_MIN_WIDTH, VIDEO_EXTS, DEDUP_HAMMING
+from archive_reader import is_archive
+from result_store import ResultStats, open_result_writer, WRITERS
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        target_folder = sys.argv[1]
+    parser = argparse.ArgumentParser(description="批量车牌识别")
+    parser.add_argument('folder', nargs='?', default=os.path.join(plate_dir, "data_jpg"),
+                        help="图片文件夹、zip/tar 压缩包或视频文件（默认 data_jpg）")
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help="并行识别的进程数（默认 1，即串行）")
+    parser.add_argument('--conf-threshold', type=float,
+                        help=f"尺度提前结束的置信度阈值（默认取 --config 中的值，否则 {SCALE_CONF_THRESHOLD}）")
+    parser.add_argument('--all-scales', action='store_true',
+                        help="总是跑完所有尺度（关闭提前结束）")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="不读写结果缓存，所有图片重新识别")
+    parser.add_argument('--rebuild-cache', action='store_true',
+                        help="清空该文件夹的结果缓存后重新识别")
+    parser.add_argument('--watch', action='store_true',
+                        help="持续监视文件夹，新图片写入后立即识别（Ctrl+C 结束）")
+    parser.add_argument('--interval', type=float, default=2.0,
+                        help="监视模式的轮询间隔秒数（默认 2）")
+    parser.add_argument('--metrics', metavar='PATH',
+                        help="记录逐图阶段耗时、尺度命中、回退与失败原因（JSONL，末行为汇总）")
+    parser.add_argument('--coarse-to-fine', action='store_true',
+                        help=f"宽度 ≥{COARSE_MIN_WIDTH} 的大图先在缩略图上找车牌，再在原图裁剪区域内识别")
+    parser.add_argument('--tiled', action='store_true',
+                        help=f"宽度 ≥{TILE_MIN_WIDTH} 的超大图切成重叠分块并发检测")
+    parser.add_argument('--parallel-scales', action='store_true',
+                        help="各尺度的缩放与识别在线程池中并发进行（总是跑完全部尺度，降低单张延迟）")
+    parser.add_argument('--clahe', action='store_true',
+                        help="检测前对亮度通道做 CLAHE 增强（暗光、逆光图片）")
+    parser.add_argument('--config', metavar='PATH',
+                        help="使用 tune.py -o 输出的调参结果（取帕累托前沿第一项）或单组配置 JSON")
+    parser.add_argument('--dedup', type=int, nargs='?', const=DEDUP_HAMMING, metavar='N',
+                        help=f"连拍去重：与最近识别图片的感知哈希汉明距离 ≤N（默认 {DEDUP_HAMMING}）时复用其结果")
+    parser.add_argument('-o', '--output', metavar='PATH',
+                        help="边识别边把结果写入文件（按扩展名：.csv / .jsonl / .parquet）")
+    parser.add_argument('--no-table', action='store_true',
+                        help="不在终端逐行打印表格，只输出统计（大批量时配合 -o 使用）")
+    parser.add_argument('--daemon', action='store_true',
+                        help="交给后台常驻的识别服务处理（不存在时自动启动，模型保持预热；不使用结果缓存）")
+    parser.add_argument('--stop-daemon', action='store_true', help="停止后台识别服务后退出")
+    parser.add_argument('--timing', action='store_true',
+                        help="输出启动耗时：参数解析、模块/模型加载、首条结果与总耗时")
+    args = parser.parse_args()
+    if args.output and not args.output.lower().endswith(tuple(WRITERS)):
+        parser.error(f"不支持的输出格式：{args.output}（可用 {', '.join(WRITERS)}）")
+    t_parsed = time.perf_counter()
+    if args.stop_daemon:
+        from daemon_client import stop_daemon
+        print("后台识别服务已停止" if stop_daemon() else "后台识别服务未运行")
+        sys.exit(0)
+    target_folder = args.folder  # 图片文件价录
+    options = {}
+    config_threshold = SCALE_CONF_THRESHOLD
+    if args.config:
+        # 调参配置改写识别模块的参数，需要在本进程内识别
+        if args.daemon:
+            parser.error("--daemon 不支持 --config：后台服务使用启动时的参数；请去掉 --daemon 在本进程内识别")
+        from plate_recognition import apply_config, load_tuned_config
+        try:
+            config_threshold, options = apply_config(load_tuned_config(args.config))
+        except (OSError, ValueError, KeyError) as e:
+            parser.error(f"无法读取调参配置 {args.config}：{e}")
+    if args.all_scales:
+        conf_threshold = None
+    elif args.conf_threshold is not None:
+        conf_threshold = args.conf_threshold
     else:
-        target_folder = os.path.join(plate_dir, "data_jpg")  # 图片文件价录
-    results = batch_process(target_folder)
+        conf_threshold = config_threshold
+    if args.clahe:
+        options['clahe'] = True
+    if args.coarse_to_fine:
+        options['coarse_to_fine'] = True
+    if args.tiled:
+        options['tiled'] = True
+    if args.parallel_scales:
+        options['parallel_scales'] = True
+    is_video = os.path.isfile(target_folder) and target_folder.lower().endswith(VIDEO_EXTS)
+    startup = '冷启动'
+    is_zip = os.path.isfile(target_folder) and is_archive(target_folder)
+    if is_video:
+        # 视频在本进程内逐帧识别并跨帧跟踪：不使用进程池、结果缓存、连拍去重与逐图记录
+        unsupported = [flag for flag, on in (('-w/--workers', args.workers > 1), ('--dedup', args.dedup is not None),
+                                             ('--metrics', args.metrics), ('--no-cache', args.no_cache),
+                                             ('--rebuild-cache', args.rebuild_cache), ('--watch', args.watch))
+                       if on]
+        if unsupported:
+            parser.error(f"视频文件不支持 {', '.join(unsupported)}：视频逐帧串行识别并跨帧跟踪，不使用结果缓存")
+    if args.daemon and not is_video and not is_zip and not args.watch:
+        # 后台服务逐张识别，不读写结果缓存，也不做连拍去重与逐图记录；这些参数不能静默忽略
+        unsupported = [flag for flag, on in (('--dedup', args.dedup is not None), ('--metrics', args.metrics),
+                                             ('--no-cache', args.no_cache), ('--rebuild-cache', args.rebuild_cache))
+                       if on]
+        if unsupported:
+            parser.error(f"--daemon 不支持 {', '.join(unsupported)}：服务逐张识别，不使用结果缓存、连拍去重与逐图记录；"
+                         "请去掉 --daemon 在本进程内识别")
+        from daemon_client import ensure_daemon, iter_daemon
+        info, started = ensure_daemon(workers=args.workers if args.workers > 1 else None,
+                                      conf_threshold=conf_threshold)
+        if not started:
+            startup = '热启动，复用后台服务'
+            if info.get('conf_threshold') != conf_threshold:
+                print(f"提示：后台服务的置信度阈值为 {info.get('conf_threshold')}，"
+                      f"如需更改请先 --stop-daemon")
+        results = iter_daemon(target_folder, options=options or None)
+    else:
+        if args.daemon:
+            print("提示：--daemon 只用于图片文件夹，压缩包、视频与监视模式在本进程内识别")
+        from plate_recognition import iter_process, watch_folder
+        if is_video:
+            # 视频文件：每辆车输出一行
+            from video_recognition import iter_video
+            results = iter_video(target_folder, conf_threshold=conf_threshold, options=options)
+        elif args.watch:
+            results = watch_folder(target_folder, interval=args.interval, workers=args.workers,
+                                   conf_threshold=conf_threshold, use_cache=not args.no_cache, options=options,
+                                   rebuild_cache=args.rebuild_cache, metrics_path=args.metrics, dedup=args.dedup)
+        else:
+            results = iter_process(target_folder, workers=args.workers, conf_threshold=conf_threshold,
+                                   use_cache=not args.no_cache, rebuild_cache=args.rebuild_cache,
+                                   metrics_path=args.metrics, options=options, dedup=args.dedup)
+    t_loaded = time.perf_counter()
+    t_first = None
     # 表格宽度设置
     COLS = {
         'name': 12,
@@ -29,6 +152,9 @@ if __name__ == "__main__":
         if s is None:
             return 0
         s = str(s)
+        # 纯 ASCII 直接取长度，不逐字符查表
+        if s.isascii():
+            return len(s)
         l = 0
         for ch in s:
             ea = unicodedata.east_asian_width(ch)
@@ -39,6 +165,8 @@ if __name__ == "__main__":
         if s is None:
             return ''
         s = str(s)
+        if s.isascii():
+            return s if len(s) <= w else s[:w] + '…'
         cur = 0
         out = ''
         for ch in s:
@@ -50,6 +178,8 @@ if __name__ == "__main__":
             cur += ch_w
         return out
 
+    # 颜色、类型、地区、状态等取值很少，按 (字符串, 宽度) 缓存排版结果
+    @functools.lru_cache(maxsize=4096)
     def fmt_fixed(s, w):
         if s is None:
             s = ''
@@ -61,57 +191,93 @@ if __name__ == "__main__":
         return t
 
     sep = ' | '
-    header = sep.join([
-        fmt_fixed('图片名称', COLS['name']),
-        fmt_fixed('识别结果', COLS['plate']),
-        fmt_fixed('颜色', COLS['color']),
-        fmt_fixed('类型', COLS['type']),
-        fmt_fixed('所属地区', COLS['location']),
-        fmt_fixed('状态', COLS['status'])
-    ])
+    show_table = not args.no_table
+    if show_table:
+        header = sep.join([
+            fmt_fixed('图片名称', COLS['name']),
+            fmt_fixed('识别结果', COLS['plate']),
+            fmt_fixed('颜色', COLS['color']),
+            fmt_fixed('类型', COLS['type']),
+            fmt_fixed('所属地区', COLS['location']),
+            fmt_fixed('状态', COLS['status'])
+        ])
 
-    total_width = sum(COLS.values()) + len(sep) * 5
-    print('=' * total_width)
-    print(header)
-    print('-' * total_width)
-    for res in results:
-        print(sep.join([
-            fmt_fixed(res.get('图片名称') or '', COLS['name']),
-            fmt_fixed(res.get('识别结果') or '', COLS['plate']),
-            fmt_fixed(res.get('车牌颜色') or '', COLS['color']),
-            fmt_fixed(res.get('车牌类型') or '', COLS['type']),
-            fmt_fixed(res.get('所属地区') or '', COLS['location']),
-            fmt_fixed(res.get('状态') or '', COLS['status'])
-        ]))
+        total_width = sum(COLS.values()) + len(sep) * 5
+        print('=' * total_width)
+        print(header)
+        print('-' * total_width)
 
-    # 状态判断
-    def is_success(st):
-        return isinstance(st, str) and st.startswith('识别成功')
+    # 边识别边输出（表格和/或结果文件），统计逐行累加，不保留全部结果
+    stats = ResultStats()
+    writer = open_result_writer(args.output) if args.output else None
+    try:
+        for res in results:
+            if t_first is None:
+                t_first = time.perf_counter()
+            stats.add(res)
+            if writer is not None:
+                writer.write(res)
+            if not show_table:
+                continue
+            status = res.get('状态') or ''
+            if res.get('去重来源'):
+                status += '（去重）'
+            print(sep.join([
+                fmt_fixed(res.get('图片名称') or '', COLS['name']),
+                fmt_fixed(res.get('识别结果') or '', COLS['plate']),
+                fmt_fixed(res.get('车牌颜色') or '', COLS['color']),
+                fmt_fixed(res.get('车牌类型') or '', COLS['type']),
+                fmt_fixed(res.get('所属地区') or '', COLS['location']),
+                fmt_fixed(status, COLS['status'])
+            ]), flush=True)
+            # 一张图片有多块车牌时，其余车牌以续行列出
+            for extra in res.get('全部车牌', [])[1:]:
+                print(sep.join([
+                    fmt_fixed('  ↳', COLS['name']),
+                    fmt_fixed(extra.get('识别结果') or '', COLS['plate']),
+                    fmt_fixed(extra.get('车牌颜色') or '', COLS['color']),
+                    fmt_fixed(extra.get('车牌类型') or '', COLS['type']),
+                    fmt_fixed(extra.get('所属地区') or '', COLS['location']),
+                    fmt_fixed('', COLS['status'])
+                ]), flush=True)
+    except KeyboardInterrupt:
+        print('\n已停止。')
+    finally:
+        if writer is not None:
+            writer.close()
 
-    success_count = sum(1 for r in results if is_success(r.get('状态')))
-    color_stats = {}
-    type_stats = {}
-    for res in results:
-        if is_success(res.get('状态')):
-            color_stats[res.get('车牌颜色', '未知')] = color_stats.get(res.get('车牌颜色', '未知'), 0) + 1
-            type_stats[res.get('车牌类型', '未知')] = type_stats.get(res.get('车牌类型', '未知'), 0) + 1
+    if stats.total == 0 and not args.watch:
+        print("未找到图片文件！")
 
     print('\n统计结果:')
-    print(f"总图片数：{len(results)}")
-    print(f"识别成功率：{(success_count/len(results) if len(results)>0 else 0):.1%}")
+    print(f"总图片数：{stats.total}")
+    print(f"识别成功率：{stats.success_rate:.1%}")
+    print(f"HyperLPR 调用：共 {stats.calls} 次，平均 {stats.calls_per_image:.2f} 次/张")
+    if stats.deduped:
+        print(f"去重复用：{stats.deduped} 张")
+    if writer is not None:
+        print(f"结果已写入：{args.output}")
     print('\n颜色分布:')
-    if success_count == 0:
+    if stats.success == 0:
         print('  无识别成功结果')
     else:
-        max_color_len = max((len(c) for c in color_stats.keys()), default=4)
-        for color, count in color_stats.items():
-            pct = (count / success_count) if success_count > 0 else 0
+        max_color_len = max((len(c) for c in stats.colors.keys()), default=4)
+        for color, count in stats.colors.items():
+            pct = count / stats.success
             print(f"  {color.ljust(max_color_len)} : {str(count).rjust(3)} 张  ({pct:.1%})")
     print('\n车辆类型:')
-    if success_count == 0:
+    if stats.success == 0:
         print('  无识别成功结果')
     else:
-        max_type_len = max((len(t) for t in type_stats.keys()), default=4)
-        for ptype, count in type_stats.items():
-            pct = (count / success_count) if success_count > 0 else 0
-            print(f"  {ptype.ljust(max_type_len)} : {str(count).rjust(3)} 辆  ({pct:.1%})")
\ No newline at end of file
+        max_type_len = max((len(t) for t in stats.types.keys()), default=4)
+        for ptype, count in stats.types.items():
+            pct = count / stats.success
+            print(f"  {ptype.ljust(max_type_len)} : {str(count).rjust(3)} 辆  ({pct:.1%})")
+    if args.timing:
+        t_end = time.perf_counter()
+        print(f"\n启动耗时（{startup}）:")
+        print(f"  参数解析  : {(t_parsed - T_START) * 1000:.0f} ms")
+        print(f"  模块加载  : {(t_loaded - t_parsed) * 1000:.0f} ms")
+        if t_first is not None:
+            print(f"  首条结果  : {(t_first - T_START) * 1000:.0f} ms")
+        print(f"  总耗时    : {(t_end - T_START) * 1000:.0f} ms")
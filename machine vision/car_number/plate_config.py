@@ -0,0 +1,37 @@
+import os
+
+# 识别流水线的可调参数。只依赖标准库，main.py 解析命令行（--help 等）时无需加载 OpenCV 与模型
+
+# 多尺度检测：默认尺度顺序，以及提前结束的置信度阈值（None 表示总是跑完所有尺度）
+DEFAULT_SCALES = (1.0, 0.8, 1.2)
+SCALE_CONF_THRESHOLD = 0.9
+# 由粗到精检测：宽度不小于 COARSE_MIN_WIDTH 的大图先在宽 COARSE_PROXY_WIDTH 的缩略图上找候选，
+# 再在原图上按候选框外扩（宽 × COARSE_PAD_X、高 × COARSE_PAD_Y，至少 COARSE_PAD_MIN 像素）裁剪识别
+COARSE_MIN_WIDTH = 2000
+COARSE_PROXY_WIDTH = 1280
+COARSE_PAD_X = 0.6
+COARSE_PAD_Y = 1.0
+COARSE_PAD_MIN = 32
+# 分块检测：宽度不小于 TILE_MIN_WIDTH 的超大图（全景停车场等）切成带重叠的 TILE_SIZE 方块，
+# 在 TILE_THREADS 个线程中并发识别（OpenCV 计算期间释放 GIL，每个线程加载一份自己的模型），
+# 接缝处的重复检测由 NMS 合并。
+# 重叠宽度应大于图中最大车牌宽度，保证每块车牌至少完整落在一个分块内
+TILE_MIN_WIDTH = 8000
+TILE_SIZE = 2048
+TILE_OVERLAP = 320
+TILE_THREADS = os.cpu_count() or 4  # 多进程时由 _init_worker 按进程数平分
+# 并发多尺度：各尺度的缩放与识别在小线程池中同时进行（每个线程一份模型，缩放写入本线程按尺寸复用的缓冲区）
+# 降低单张图片的延迟；与进程池的多图并行互不影响
+SCALE_THREADS = len(DEFAULT_SCALES)
+RESIZE_BUFFER_LIMIT = 16
+# 跨尺度候选合并的 IoU 阈值
+NMS_IOU_THRESHOLD = 0.3
+# 连拍去重：在最近 DEDUP_WINDOW 张已识别图片中，dHash 汉明距离不超过 DEDUP_HAMMING（共 64 位）
+# 的图片直接复用其结果，不再调用检测器
+DEDUP_HAMMING = 4
+DEDUP_WINDOW = 16
+# 流水线版本：识别逻辑变化时递增，使旧的结果缓存失效
+PIPELINE_VERSION = 2
+# 支持的图片与视频扩展名
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.bmp')
+VIDEO_EXTS = ('.mp4', '.avi', '.mkv', '.mov', '.flv', '.ts')
@@ -1,11 +1,22 @@
 import os
 # import sys
 import re
+import json
+import time
+import itertools
+import sqlite3
+import threading
+from collections import deque
 import numpy as np
-import glob
 import cv2
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from hyperlpr import HyperLPR_plate_recognition
 from plate_mappings import PROVINCE_MAP, SPECIAL_PLATE_TYPES
+from result_cache import config_fingerprint, open_folder_cache, read_folder_scale_wins
+from instrumentation import Trace, TraceAggregator, span
+from debug_writer import DebugImageWriter
+from archive_reader import is_archive, iter_archive_images, PREFETCH_DEPTH
+from result_store import ResultStore, open_result_writer
 # 解决 OpenCV 兼容性问题
 if not hasattr(cv2, 'estimateRigidTransform'):
     def _estimateRigidTransform(src, dst, fullAffine=False):
@@ -15,8 +26,15 @@ if not hasattr(cv2, 'estimateRigidTransform'):
 # 解决numpy兼容问题
 if not hasattr(np, 'int'):
     np.int = np.int32
-# 调试开关
+# 调试开关：只控制批次级的汇总打印；逐图的阶段耗时、尺度命中、回退与失败原因
+# 由 instrumentation 记录（batch_process(metrics_path=...) 开启）
 DEBUG = True
+# 未识别图片的调试输出：是否保存、采样率（0~1）、每个 debug_outputs 目录的容量上限
+SAVE_DEBUG_IMAGES = True
+DEBUG_SAVE_SAMPLE = 1.0
+DEBUG_DIR_MAX_BYTES = 500 * 1024 * 1024
+# 检测参数（尺度、粗到精、分块、NMS 等）见 plate_config，CLI 不加载模型即可读取
+from plate_config import *
 # 常见车牌字符串后处理
 def postprocess_plate(plate_str):
     if not plate_str:
@@ -69,70 +87,153 @@ def correct_plate_string(plate_str):
                 chars[i] = mapping[c]
 
     return ''.join(chars)
-# 基于颜色空间分析车牌颜色
-def get_plate_color(image, plate_region):
-    if not plate_region or all(v == 0 for v in plate_region):
-        return "未知"
+# 单张图片的处理上下文：只解码、只转换一次 HSV，各阶段共享 ROI 视图
+class PlateImageContext:
+    def __init__(self, image):
+        self.image = image
+        self.hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        self.enhanced = None
 
-    x1, y1, x2, y2 = map(int, plate_region)
-    plate_img = image[y1:y2, x1:x2]
-    if plate_img.size == 0:
-        return "未知"
+    def enhance(self):
+        """原地增强 self.hsv，并生成 self.enhanced（BGR）。"""
+        if self.enhanced is None:
+            self.enhanced = enhance_image_for_plate(self.image, hsv=self.hsv)
+        return self.enhanced
 
-    hsv = cv2.cvtColor(plate_img, cv2.COLOR_BGR2HSV)
-    pixel_count = plate_img.shape[0] * plate_img.shape[1]
+    def plate_hsv(self, bbox):
+        """车牌区域的 HSV：由增强图（BGR）的 ROI 转换而来。
+        不直接取增强后的 self.hsv：HSV -> BGR 的取整与饱和会让 S 通道差出几十，颜色判定随之改变；
+        只转换车牌大小的 ROI，开销很小。"""
+        x1, y1, x2, y2 = map(int, bbox)
+        return cv2.cvtColor(self.enhanced[y1:y2, x1:x2], cv2.COLOR_BGR2HSV)
 
-    # 颜色阈值范围
-    PLATE_COLOR_RANGES = {
-        'blue': [(90, 40, 40), (130, 255, 255)],
-        'yellow': [(15, 60, 60), (40, 255, 255)],
-        'green': [(35, 30, 30), (95, 255, 255)],
-        'red1': [(0, 60, 50), (10, 255, 255)],
-        'red2': [(160, 60, 50), (180, 255, 255)],
-    }
+# 车牌颜色阈值范围（HSV，上下界均包含）
+PLATE_COLOR_RANGES = {
+    'blue': [(90, 40, 40), (130, 255, 255)],
+    'yellow': [(15, 60, 60), (40, 255, 255)],
+    'green': [(35, 30, 30), (95, 255, 255)],
+    'red1': [(0, 60, 50), (10, 255, 255)],
+    'red2': [(160, 60, 50), (180, 255, 255)],
+    # 左黄右绿大型新能源车牌左侧的黄色（比普通黄牌宽松）
+    'split_yellow': [(15, 40, 40), (40, 255, 255)],
+}
 
-    def mask_ratio(hsv_img, low, up):
-        low = np.array(low, dtype=np.uint8)
-        up = np.array(up, dtype=np.uint8)
-        mask = cv2.inRange(hsv_img, low, up)
-        return cv2.countNonZero(mask) / float(pixel_count)
+# 颜色查表：各范围可能重叠（如蓝/绿在 H 90~95），因此每个像素的类别是“所属范围的位掩码”，
+# 第 i 位对应 PLATE_COLOR_RANGES 的第 i 个颜色。每个通道按全部阈值边界分段，
+# 同一段内成员关系不变，所以查表结果与逐个 cv2.inRange 完全一致。
+def _build_color_lut(ranges):
+    bin_maps = []
+    reps = []
+    for c in range(3):
+        edges = sorted({lo[c] for lo, _ in ranges.values()} | {up[c] + 1 for _, up in ranges.values()})
+        bin_map = np.searchsorted(edges, np.arange(256), side='right')
+        bin_maps.append(bin_map.astype(np.intp))
+        # 每段取一个代表值（该段最小的像素值）
+        reps.append(np.array([np.argmax(bin_map == b) for b in range(bin_map.max() + 1)]))
+    H, S, V = np.meshgrid(*reps, indexing='ij')
+    lut = np.zeros(H.shape, dtype=np.uint8)
+    for bit, (lo, up) in enumerate(ranges.values()):
+        inside = ((H >= lo[0]) & (H <= up[0]) & (S >= lo[1]) & (S <= up[1]) &
+                  (V >= lo[2]) & (V <= up[2]))
+        lut |= (inside.astype(np.uint8) << bit)
+    return bin_maps, lut
 
-    ratios = {}
-    ratios['blue'] = mask_ratio(hsv, *PLATE_COLOR_RANGES['blue'])
-    ratios['yellow'] = mask_ratio(hsv, *PLATE_COLOR_RANGES['yellow'])
-    ratios['green'] = mask_ratio(hsv, *PLATE_COLOR_RANGES['green'])
-    red_ratio = mask_ratio(hsv, *PLATE_COLOR_RANGES['red1']) + mask_ratio(hsv, *PLATE_COLOR_RANGES['red2'])
+_COLOR_NAMES = tuple(PLATE_COLOR_RANGES)
+_COLOR_CODES = 1 << len(_COLOR_NAMES)
+_COLOR_BIN_MAPS, _COLOR_LUT = _build_color_lut(PLATE_COLOR_RANGES)
+# 位掩码 -> 各颜色是否命中，用于把 bincount 直方图一次换算成全部颜色占比
+_COLOR_HAS_BIT = ((np.arange(_COLOR_CODES)[:, None] >> np.arange(len(_COLOR_NAMES))) & 1).astype(np.float64)
 
+# HSV ROI -> 每像素颜色位掩码（一次查表）
+def plate_color_codes(hsv_roi):
+    hb, sb, vb = _COLOR_BIN_MAPS
+    return _COLOR_LUT[hb[hsv_roi[..., 0]], sb[hsv_roi[..., 1]], vb[hsv_roi[..., 2]]]
+
+# 位掩码数组 -> {颜色: 占比}
+def _color_ratios(codes):
+    if codes.size == 0:
+        return None
+    counts = np.bincount(codes.ravel(), minlength=_COLOR_CODES)
+    return dict(zip(_COLOR_NAMES, (counts @ _COLOR_HAS_BIT) / float(codes.size)))
+
+# 颜色判定阈值：主色（新能源绿 / 蓝 / 黄）占比下限，红色与兜底颜色占比下限
+COLOR_MIN_RATIO = 0.18
+COLOR_FALLBACK_RATIO = 0.12
+
+# 根据颜色占比与 S/V 均值判定车牌颜色
+def _decide_plate_color(ratios, mean_s, mean_v):
+    red_ratio = ratios['red1'] + ratios['red2']
     # 白色判断：S 低且 V 高
-    _, s_channel, v_channel = cv2.split(hsv)
-    mean_s = float(np.mean(s_channel))
-    mean_v = float(np.mean(v_channel))
     is_white = (mean_s <= 60 and mean_v >= 180)
 
     # 判定优先级：新能源绿 -> 蓝 -> 黄 -> 白 -> 红 -> 兜底
-    if ratios.get('green', 0.0) >= 0.18:
+    if ratios.get('green', 0.0) >= COLOR_MIN_RATIO:
         return '新能源浅绿'
-    if ratios.get('blue', 0.0) >= 0.18:
+    if ratios.get('blue', 0.0) >= COLOR_MIN_RATIO:
         return '蓝色'
-    if ratios.get('yellow', 0.0) >= 0.18:
+    if ratios.get('yellow', 0.0) >= COLOR_MIN_RATIO:
         return '黄色'
     if is_white:
         return '白色'
-    if red_ratio >= 0.12:
+    if red_ratio >= COLOR_FALLBACK_RATIO:
         return '红色'
 
     # 兜底：返回占比最大的颜色（若超过低阈值）
     candidates = {'blue': ratios.get('blue', 0.0), 'yellow': ratios.get('yellow', 0.0),
                   'green': ratios.get('green', 0.0), 'red': red_ratio}
     main = max(candidates, key=candidates.get)
-    if candidates.get(main, 0.0) >= 0.12:
+    if candidates.get(main, 0.0) >= COLOR_FALLBACK_RATIO:
         mapping = {'blue': '蓝色', 'yellow': '黄色', 'green': '绿色', 'red': '红色'}
         return mapping.get(main, '未知')
 
     return '未知'
 
+# 基于颜色空间分析车牌颜色
+def get_plate_color(image, plate_region, hsv=None, codes=None, plate_hsv=None):
+    """hsv 为整图（或同尺寸）HSV 时直接取 ROI 视图，避免重复转换；plate_hsv 为已转换好的车牌 ROI HSV；
+    codes 为该 ROI 已算好的 plate_color_codes 结果时直接复用。"""
+    if not plate_region or all(v == 0 for v in plate_region):
+        return "未知"
+
+    x1, y1, x2, y2 = map(int, plate_region)
+    plate_img = image[y1:y2, x1:x2]
+    if plate_img.size == 0:
+        return "未知"
+
+    if plate_hsv is not None:
+        hsv = plate_hsv
+    elif hsv is not None:
+        hsv = hsv[y1:y2, x1:x2]
+    else:
+        hsv = cv2.cvtColor(plate_img, cv2.COLOR_BGR2HSV)
+    if codes is None:
+        codes = plate_color_codes(hsv)
+
+    # cv2.mean 按通道求均值，不拆分拷贝
+    _, mean_s, mean_v, _ = cv2.mean(hsv)
+    return _decide_plate_color(_color_ratios(codes), mean_s, mean_v)
+
+# 批量颜色判定：多个 HSV ROI 的直方图用一次 bincount 得到
+def classify_plate_colors(hsv_rois):
+    names = ['未知'] * len(hsv_rois)
+    idx = [i for i, r in enumerate(hsv_rois) if r is not None and r.size > 0]
+    if not idx:
+        return names
+    sizes = np.array([hsv_rois[i].shape[0] * hsv_rois[i].shape[1] for i in idx])
+    roi_ids = np.repeat(np.arange(len(idx)), sizes)
+    codes = np.concatenate([plate_color_codes(hsv_rois[i]).ravel() for i in idx])
+    counts = np.bincount(roi_ids * _COLOR_CODES + codes,
+                         minlength=len(idx) * _COLOR_CODES).reshape(len(idx), _COLOR_CODES)
+    ratios = (counts @ _COLOR_HAS_BIT) / sizes[:, None]
+    sum_s = np.bincount(roi_ids, weights=np.concatenate([hsv_rois[i][..., 1].ravel() for i in idx]))
+    sum_v = np.bincount(roi_ids, weights=np.concatenate([hsv_rois[i][..., 2].ravel() for i in idx]))
+    for k, i in enumerate(idx):
+        names[i] = _decide_plate_color(dict(zip(_COLOR_NAMES, ratios[k])),
+                                       sum_s[k] / sizes[k], sum_v[k] / sizes[k])
+    return names
+
 # 判断是否为左黄右绿的新能源大型车牌
-def is_split_yellow_green_plate(image, plate_region):
+def is_split_yellow_green_plate(image, plate_region, hsv=None, codes=None):
     if not plate_region:
         return False
     x1, y1, x2, y2 = map(int, plate_region)
@@ -145,32 +246,35 @@ def is_split_yellow_green_plate(image, plate_region):
     left_ratio = 0.18
     left_w = max(1, int(w * left_ratio))
 
-    left_img = plate_img[:, :left_w]
-    right_img = plate_img[:, left_w:]
-
-    hsv_l = cv2.cvtColor(left_img, cv2.COLOR_BGR2HSV)
-    hsv_r = cv2.cvtColor(right_img, cv2.COLOR_BGR2HSV)
-
-    # 黄色与绿色阈值
-    low_y, up_y = np.array([15, 40, 40], dtype=np.uint8), np.array([40, 255, 255], dtype=np.uint8)
-    low_g, up_g = np.array([35, 30, 30], dtype=np.uint8), np.array([95, 255, 255], dtype=np.uint8)
-
-    mask_l_y = cv2.inRange(hsv_l, low_y, up_y)
-    mask_r_g = cv2.inRange(hsv_r, low_g, up_g)
+    if codes is None:
+        if hsv is not None:
+            plate_hsv = hsv[y1:y2, x1:x2]
+        else:
+            plate_hsv = cv2.cvtColor(plate_img, cv2.COLOR_BGR2HSV)
+        codes = plate_color_codes(plate_hsv)
 
-    ratio_l_y = cv2.countNonZero(mask_l_y) / float(left_img.shape[0] * left_img.shape[1])
-    ratio_r_g = cv2.countNonZero(mask_r_g) / float(right_img.shape[0] * right_img.shape[1])
+    # 与颜色判定共用同一份位掩码，按列带分别统计
+    ratios_l = _color_ratios(codes[:, :left_w])
+    ratios_r = _color_ratios(codes[:, left_w:])
+    if ratios_l is None or ratios_r is None:
+        return False
 
     # 阈值可调整：左侧黄色占比至少 0.4，右侧绿色占比至少 0.25
-    if ratio_l_y >= 0.40 and ratio_r_g >= 0.25:
+    if ratios_l['split_yellow'] >= 0.40 and ratios_r['green'] >= 0.25:
         return True
     return False
 
-def enhance_image_for_plate(image):
+# 增强幅度：各颜色区域的 S / V 提升量
+ENHANCE_S_BOOST = {'blue': 30, 'green': 0, 'red': 0}
+ENHANCE_V_BOOST = {'blue': 0, 'green': 20, 'red': 30}
+
+def enhance_image_for_plate(image, hsv=None):
     """图像增强：对可能的车牌颜色区域做小幅度增强，返回增强后的 BGR 图像。
     增强策略保守，避免破坏原始字符信息。
+    传入 hsv 时复用该数组，并将增强结果原地写回（调用方可继续使用增强后的 HSV）。
     """
-    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    if hsv is None:
+        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
     h, s, v = cv2.split(hsv)
 
     # 简化并参数化增强：对蓝/绿/红区域做轻微的 S/V 提升
@@ -181,18 +285,26 @@ def enhance_image_for_plate(image):
     }
 
     # 提升参数
-    s_increase = {'blue': 30, 'green': 0, 'red': 0}
-    v_increase = {'blue': 0, 'green': 20, 'red': 30}
+    s_increase = ENHANCE_S_BOOST
+    v_increase = ENHANCE_V_BOOST
 
+    # 三种颜色的色相区间互不影响对方的掩膜，故掩膜缓冲区可复用；
+    # cv2.add 带掩膜原地饱和加法，等价于 clip(x + d, 0, 255)，无临时数组
+    # （旧写法 np.clip(s[mask > 0] + d) 中 uint8 相加先回绕，S > 225 的像素反而变成低饱和度）
+    mask = np.empty(hsv.shape[:2], dtype=np.uint8)
     for cname, (low, up) in color_masks.items():
-        mask = cv2.inRange(hsv, low, up)
+        cv2.inRange(hsv, low, up, dst=mask)
         if s_increase.get(cname, 0) > 0:
-            s[mask > 0] = np.clip(s[mask > 0] + s_increase[cname], 0, 255)
+            cv2.add(s, s_increase[cname], dst=s, mask=mask)
         if v_increase.get(cname, 0) > 0:
-            v[mask > 0] = np.clip(v[mask > 0] + v_increase[cname], 0, 255)
+            cv2.add(v, v_increase[cname], dst=v, mask=mask)
+
+    cv2.merge([h, s, v], dst=hsv)
+    return cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
 
-    enhanced_hsv = cv2.merge([h, s, v])
-    return cv2.cvtColor(enhanced_hsv, cv2.COLOR_HSV2BGR)
+# CLAHE 参数（检测选项 'clahe' 开启时在检测前使用）
+CLAHE_CLIP_LIMIT = 3.0
+CLAHE_TILE_GRID = (8, 8)
 
 # 预处理函数: CLAHE + 锐化
 def preprocess_for_recognition(image):
@@ -201,7 +313,7 @@ def preprocess_for_recognition(image):
     h, s, v = cv2.split(hsv)
     # CLAHE 在 V 通道
     try:
-        clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
+        clahe = cv2.createCLAHE(clipLimit=CLAHE_CLIP_LIMIT, tileGridSize=CLAHE_TILE_GRID)
         v_clahe = clahe.apply(v)
     except Exception:
         v_clahe = v
@@ -226,37 +338,256 @@ def check_plate_number_format(plate_str, plate_color):
     if plate_color == "蓝色":
         return (length == 7), "2+5(总长7)", ("" if length == 7 else f"长度 {length} != 7")
     return True, None, ""
+# 尺度调度：按历史命中次数排序尺度，置信度达标即提前结束
+# 每个 batch_process（即每个文件夹）使用一个实例，顺序随摄像头自适应；
+# wins 为历次运行保存下来的命中次数（见 ResultCache.scale_wins），从上次的顺序继续
+class ScaleScheduler:
+    # scales 默认取调用时的 DEFAULT_SCALES（apply_config 可能已改写）
+    def __init__(self, scales=None, conf_threshold=SCALE_CONF_THRESHOLD, wins=None):
+        self.scales = tuple(scales if scales is not None else DEFAULT_SCALES)
+        self.conf_threshold = conf_threshold
+        self.wins = {s: int((wins or {}).get(s, 0)) for s in self.scales}
+
+    # 命中多的尺度优先；次数相同保持默认顺序
+    def order(self):
+        return sorted(self.scales, key=lambda s: (-self.wins[s], self.scales.index(s)))
+
+    def should_stop(self, results):
+        if self.conf_threshold is None or not results:
+            return False
+        return max(float(r.get('conf', 0.0)) for r in results) >= self.conf_threshold
+
+    def record(self, results):
+        if results:
+            best = max(results, key=lambda x: float(x.get('conf', 0.0)))
+            self.wins[best['scale']] = self.wins.get(best['scale'], 0) + 1
+
 # 核心检测函数，支持多尺度检测
-def _detect_plates_hyperlpr(img_name,image, scales=(1.0, 0.8, 1.2)):
+# stats 若为 dict，累计 'hyperlpr_calls'（HyperLPR 调用次数），并写入命中尺度 'best_scale'；
+# stats['trace'] 为 Trace 时记录各尺度耗时
+def _detect_plates_hyperlpr(img_name,image, scales=DEFAULT_SCALES, scheduler=None, stats=None):
+    trace = stats.get('trace') if stats is not None else None
+    if scheduler is not None:
+        scales = scheduler.order()
     all_results = []
     for scale in scales:
-        try:
+        with span(trace, f'hyperlpr@{scale}'):
+            try:
+                if scale != 1.0:
+                    resized = cv2.resize(image, (0, 0), fx=scale, fy=scale)
+                else:
+                    resized = image
+            except Exception:
+                # 缩放失败也算一次尝试，与调用失败一样计入调用次数
+                if stats is not None:
+                    stats['hyperlpr_calls'] = stats.get('hyperlpr_calls', 0) + 1
+                continue
+            all_results.extend(_call_hyperlpr(resized, scale, stats, trace))
+
+        if scheduler is not None and scheduler.should_stop(all_results):
+            break
+
+    if scheduler is not None:
+        scheduler.record(all_results)
+    if all_results:
+        best = max(all_results, key=lambda x: float(x.get('conf', 0.0)))
+        if stats is not None:
+            stats['best_scale'] = best['scale']
+        if trace is not None:
+            trace.count(f"scale_hit@{best['scale']}")
+    return all_results
+
+# HyperLPR 的共享模型（CascadeClassifier 与 cv2.dnn 网络，setInput / forward 有内部状态）不能被多个线程
+# 同时调用：分块与并发尺度的工作线程各自加载一份模型；没有 LPR 类的 HyperLPR 版本退回共享模型 + 全局锁。
+# 缩放缓冲区同样按线程保存，一个线程同一时刻只执行一个任务，因此可安全复用
+_thread_state = threading.local()
+_hyperlpr_lock = threading.Lock()
+
+def _load_thread_hyperlpr():
+    try:
+        import hyperlpr
+        lpr = hyperlpr.LPR(os.path.join(os.path.dirname(os.path.abspath(hyperlpr.__file__)), 'models'))
+    except Exception:
+        def locked(image):
+            with _hyperlpr_lock:
+                return HyperLPR_plate_recognition(image)
+        return locked
+    return lambda image: lpr.plate_recognition(image, 30, True)
+
+# 当前线程自己的 HyperLPR 识别函数，首次调用时加载
+def _thread_hyperlpr():
+    fn = getattr(_thread_state, 'hyperlpr', None)
+    if fn is None:
+        fn = _thread_state.hyperlpr = _load_thread_hyperlpr()
+    return fn
+
+# 每个进程一个尺度线程池，首次需要时创建
+_scale_pool = None
+
+def _get_scale_pool():
+    global _scale_pool
+    if _scale_pool is None:
+        _scale_pool = ThreadPoolExecutor(max_workers=SCALE_THREADS, thread_name_prefix='plate-scale')
+    return _scale_pool
+
+# 取当前线程 (尺度, 目标尺寸) 对应的缓冲区
+def _resize_buffer(scale, shape):
+    buffers = getattr(_thread_state, 'buffers', None)
+    if buffers is None:
+        buffers = _thread_state.buffers = {}
+    key = (scale, shape)
+    buf = buffers.get(key)
+    if buf is None:
+        if len(buffers) >= RESIZE_BUFFER_LIMIT:
+            buffers.clear()
+        buf = buffers[key] = np.empty(shape, dtype=np.uint8)
+    return buf
+
+# 各尺度并发检测：总是跑完全部尺度（不提前结束），调度器仍记录命中尺度
+def _detect_plates_parallel(img_name, image, scales=DEFAULT_SCALES, scheduler=None, stats=None):
+    trace = stats.get('trace') if stats is not None else None
+    h, w = image.shape[:2]
+
+    def run_scale(scale):
+        local = {'hyperlpr_calls': 0}
+        with span(trace, f'hyperlpr@{scale}'):
             if scale != 1.0:
-                resized = cv2.resize(image, (0, 0), fx=scale, fy=scale)
+                tw, th = int(round(w * scale)), int(round(h * scale))
+                buf = _resize_buffer(scale, (th, tw) + image.shape[2:])
+                resized = cv2.resize(image, (tw, th), dst=buf)
             else:
                 resized = image
-            try:
-                res = HyperLPR_plate_recognition(resized) or []
-            except Exception as e:
-                if DEBUG:
-                    print(f"HyperLPR(array) 调用异常(scale={scale}): {e}")
-                res = []
-        except Exception:
-            res = []
-
-        if DEBUG:
-            try:
-                print(f"图片名称={img_name},检测车牌（使用hyperlpr技术）: 缩放比例={scale}, 识别结果={len(res)}")
-            except Exception:
-                pass
+            found = _call_hyperlpr(resized, scale, local, trace, threaded=True)
+        return found, local['hyperlpr_calls']
 
-        for r in res:
-            plate = r[0] if len(r) > 0 else ''
-            conf = r[1] if len(r) > 1 else 0.0
-            bbox = r[2] if len(r) > 2 else None
-            all_results.append({'plate': plate, 'conf': conf, 'bbox': bbox, 'scale': scale})
+    all_results = []
+    for found, calls in _get_scale_pool().map(run_scale, scales):
+        all_results.extend(found)
+        if stats is not None:
+            stats['hyperlpr_calls'] = stats.get('hyperlpr_calls', 0) + calls
+    if scheduler is not None:
+        scheduler.record(all_results)
+    if all_results:
+        best = max(all_results, key=lambda x: float(x.get('conf', 0.0)))
+        if stats is not None:
+            stats['best_scale'] = best['scale']
+        if trace is not None:
+            trace.count(f"scale_hit@{best['scale']}")
     return all_results
 
+# 单次调用 HyperLPR，结果统一为候选 dict 列表；threaded 为 True（线程池中调用）时使用本线程自己的模型
+def _call_hyperlpr(image, scale, stats=None, trace=None, threaded=False):
+    if stats is not None:
+        stats['hyperlpr_calls'] = stats.get('hyperlpr_calls', 0) + 1
+    recognize = _thread_hyperlpr() if threaded else HyperLPR_plate_recognition
+    try:
+        res = recognize(np.ascontiguousarray(image)) or []
+    except Exception:
+        if trace is not None:
+            trace.count('hyperlpr_error')
+        res = []
+    out = []
+    for r in res:
+        plate = r[0] if len(r) > 0 else ''
+        conf = r[1] if len(r) > 1 else 0.0
+        bbox = r[2] if len(r) > 2 else None
+        out.append({'plate': plate, 'conf': conf, 'bbox': bbox, 'scale': scale})
+    return out
+
+# 由粗到精检测：缩略图上找候选，原图裁剪区域内精识别；候选框均已映射为原图坐标（scale=1.0）
+# 缩略图上没有候选时退回常规多尺度检测，避免漏检
+def _detect_plates_coarse_to_fine(img_name, image, scheduler=None, stats=None):
+    trace = stats.get('trace') if stats is not None else None
+    h, w = image.shape[:2]
+    scale = COARSE_PROXY_WIDTH / float(w)
+    with span(trace, 'coarse'):
+        proxy = cv2.resize(image, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        coarse = _call_hyperlpr(proxy, scale, stats, trace)
+    if not coarse:
+        if trace is not None:
+            trace.count('coarse_miss')
+        return _detect_plates_hyperlpr(img_name, image, scales=DEFAULT_SCALES, scheduler=scheduler, stats=stats)
+
+    results = []
+    for c in coarse:
+        box = _map_bbox_to_original(c['bbox'], scale, image.shape)
+        if box is None:
+            continue
+        x1, y1, x2, y2 = box
+        px = max(COARSE_PAD_MIN, int((x2 - x1) * COARSE_PAD_X))
+        py = max(COARSE_PAD_MIN, int((y2 - y1) * COARSE_PAD_Y))
+        cx1, cy1 = max(0, x1 - px), max(0, y1 - py)
+        cx2, cy2 = min(w, x2 + px), min(h, y2 + py)
+        with span(trace, 'fine'):
+            fine = _call_hyperlpr(image[cy1:cy2, cx1:cx2], 1.0, stats, trace)
+        if fine:
+            best = max(fine, key=lambda x: float(x.get('conf', 0.0)))
+            bb = best['bbox']
+            if bb:
+                bb = list(map(int, bb))
+                best['bbox'] = (bb[0] + cx1, bb[1] + cy1, bb[2] + cx1, bb[3] + cy1)
+            results.append(best)
+        else:
+            # 精识别失败时保留缩略图上的结果
+            results.append({'plate': c['plate'], 'conf': c['conf'], 'bbox': box, 'scale': 1.0})
+    return results
+
+# 分块坐标 (x1, y1, x2, y2)：分块均匀铺满图像，相邻分块重叠不少于 overlap
+def _tile_grid(h, w, size=TILE_SIZE, overlap=TILE_OVERLAP):
+    step = max(1, size - overlap)
+
+    def starts(n):
+        if n <= size:
+            return [0]
+        count = -(-(n - size) // step) + 1
+        return [int(round(v)) for v in np.linspace(0, n - size, count)]
+    return [(x, y, min(w, x + size), min(h, y + size)) for y in starts(h) for x in starts(w)]
+
+# 每个进程一个分块线程池，首次需要时创建
+_tile_pool = None
+
+def _get_tile_pool():
+    global _tile_pool
+    if _tile_pool is None:
+        _tile_pool = ThreadPoolExecutor(max_workers=TILE_THREADS, thread_name_prefix='plate-tile')
+    return _tile_pool
+
+# 分块并发检测；候选框均为原图坐标（scale=1.0）
+# stats 中写入 'tiles'（分块数）与 'tile_ms'（各分块耗时，毫秒）
+def _detect_plates_tiled(img_name, image, stats=None):
+    trace = stats.get('trace') if stats is not None else None
+    h, w = image.shape[:2]
+    grid = _tile_grid(h, w)
+
+    def run_tile(tile):
+        x1, y1, x2, y2 = tile
+        t0 = time.perf_counter()
+        local = {'hyperlpr_calls': 0}
+        found = _call_hyperlpr(image[y1:y2, x1:x2], 1.0, local, trace, threaded=True)
+        for c in found:
+            bb = c['bbox']
+            if bb:
+                bb = list(map(int, bb))
+                c['bbox'] = (bb[0] + x1, bb[1] + y1, bb[2] + x1, bb[3] + y1)
+        return found, local['hyperlpr_calls'], (time.perf_counter() - t0) * 1000.0
+
+    with span(trace, 'tiles'):
+        outputs = list(_get_tile_pool().map(run_tile, grid))
+
+    results = []
+    tile_ms = []
+    for found, calls, ms in outputs:
+        results.extend(found)
+        tile_ms.append(round(ms, 2))
+        if stats is not None:
+            stats['hyperlpr_calls'] = stats.get('hyperlpr_calls', 0) + calls
+    if stats is not None:
+        stats['tiles'] = len(grid)
+        stats['tile_ms'] = tile_ms
+    if trace is not None:
+        trace.count('tiles', len(grid))
+    return results
+
 # 映射检测框坐标到原始图像尺寸
 def _map_bbox_to_original(bbox, scale, img_shape):
     if not bbox:
@@ -279,161 +610,719 @@ def _map_bbox_to_original(bbox, scale, img_shape):
     except Exception:
         return None
 
+# 每个进程一个后台调试图片写入器，首次需要时创建
+_debug_writer = None
+
+def _get_debug_writer():
+    global _debug_writer
+    if _debug_writer is None:
+        _debug_writer = DebugImageWriter(max_bytes=DEBUG_DIR_MAX_BYTES, sample_rate=DEBUG_SAVE_SAMPLE)
+    return _debug_writer
+
+# 未检测到车牌时保存原图与增强图，便于排查（交给后台线程写盘，识别循环不等待）
+def _save_debug_images(image_path, image, enhanced_img, trace=None):
+    if not SAVE_DEBUG_IMAGES:
+        return
+    dbg_dir = os.path.join(os.path.dirname(image_path), 'debug_outputs')
+    base = os.path.splitext(os.path.basename(image_path))[0]
+    queued = _get_debug_writer().submit(dbg_dir, base, [('_orig', image), ('_enhanced', enhanced_img)])
+    if trace is not None and not queued:
+        trace.count('debug_save_skipped')
+
 # 主识别函数
-def recognize_plate(image_path):
+def recognize_plate(image_path, scheduler=None, stats=None, options=None):
     if not os.path.exists(image_path):
         return None, "文件不存在", None, None
 
-    image = cv2.imread(image_path)
+    trace = stats.get('trace') if stats is not None else None
+    with span(trace, 'imread'):
+        image = cv2.imread(image_path)
     if image is None:
         return None, "无法读取图片", None, None
 
-    enhanced_img = enhance_image_for_plate(image)
-    img_name = os.path.basename(image_path)
+    return recognize_image(image, os.path.basename(image_path), scheduler=scheduler, stats=stats,
+                           on_miss=lambda img, enh: _save_debug_images(image_path, img, enh, trace),
+                           options=options)
+
+# 对已解码的 BGR 图像识别（视频帧等无文件路径的输入）
+# stats 若为 dict，识别成功时额外写入 'bbox'（原图坐标）与 'conf'
+# on_miss(image, enhanced_img)：未检测到车牌时的回调
+# options：检测选项 dict，'tiled' 为 True 时超大图分块并发检测，'coarse_to_fine' 为 True 时大图走由粗到精检测，
+# 'parallel_scales' 为 True 时其余图片的各尺度并发检测，'clahe' 为 True 时检测前先做 CLAHE + 锐化
+def recognize_image(image, img_name='', scheduler=None, stats=None, on_miss=None, options=None):
+    options = options or {}
+    trace = stats.get('trace') if stats is not None else None
+    with span(trace, 'enhance'):
+        ctx = PlateImageContext(image)
+        enhanced_img = ctx.enhance()
+    if options.get('clahe'):
+        # 只用于检测；颜色判定仍基于增强图
+        with span(trace, 'clahe'):
+            det_img = preprocess_for_recognition(enhanced_img)
+    else:
+        det_img = enhanced_img
 
     try:
         # 多尺度检测
-        candidates = _detect_plates_hyperlpr(img_name,enhanced_img, scales=(1.0, 0.8, 1.2))
+        if options.get('tiled') and det_img.shape[1] >= TILE_MIN_WIDTH:
+            candidates = _detect_plates_tiled(img_name, det_img, stats=stats)
+        elif options.get('coarse_to_fine') and det_img.shape[1] >= COARSE_MIN_WIDTH:
+            candidates = _detect_plates_coarse_to_fine(img_name, det_img, scheduler=scheduler, stats=stats)
+        elif options.get('parallel_scales'):
+            candidates = _detect_plates_parallel(img_name, det_img, scales=DEFAULT_SCALES,
+                                                 scheduler=scheduler, stats=stats)
+        else:
+            candidates = _detect_plates_hyperlpr(img_name,det_img, scales=DEFAULT_SCALES,
+                                                 scheduler=scheduler, stats=stats)
         if not candidates:
             # 回退：仅尝试以图像数组调用 hyperlpr（路径调用在某些版本会导致类型错误）
-            direct = []
-            try:
-                if HyperLPR_plate_recognition is None:
-                    if DEBUG:
-                        print("HyperLPR_plate_recognition 未导入，跳过回退调用")
-                else:
-                    if DEBUG:
-                        print(f"主检测未命中，尝试直接用 HyperLPR_plate_recognition(image)")
-                    direct = HyperLPR_plate_recognition(enhanced_img) or []
-            except Exception as e:
-                direct = []
-                if DEBUG:
-                    print(f"direct(array) 调用异常: {e}")
-
-            if direct:
-                if DEBUG:
-                    print(f"回退检测命中 {len(direct)} 条结果")
-                candidates = []
-                for r in direct:
-                    plate = r[0] if len(r) > 0 else ''
-                    conf = r[1] if len(r) > 1 else 0.0
-                    bbox = r[2] if len(r) > 2 else None
-                    candidates.append({'plate': plate, 'conf': conf, 'bbox': bbox, 'scale': 1.0})
+            if trace is not None:
+                trace.count('fallback_used')
+            with span(trace, 'fallback'):
+                candidates = _call_hyperlpr(det_img, 1.0, stats, trace)
+            if candidates and trace is not None:
+                trace.count('fallback_hit')
 
             if not candidates:
-                try:
-                    dbg_dir = os.path.join(os.path.dirname(image_path), 'debug_outputs')
-                    os.makedirs(dbg_dir, exist_ok=True)
-                    base = os.path.splitext(os.path.basename(image_path))[0]
-                    orig_p = os.path.join(dbg_dir, base + '_orig.jpg')
-                    enh_p = os.path.join(dbg_dir, base + '_enhanced.jpg')
-                    cv2.imwrite(orig_p, image)
-                    cv2.imwrite(enh_p, enhanced_img)
-                    if DEBUG:
-                        print(f"未检测到车牌，已保存调试图像到: {dbg_dir}")
-                except Exception as e:
-                    if DEBUG:
-                        print(f"保存调试图像失败: {e}")
-
+                if on_miss is not None:
+                    with span(trace, 'debug_save'):
+                        on_miss(image, enhanced_img)
                 return None, "未识别到车牌", None, None
 
-        # 取置信度最高
-        best = max(candidates, key=lambda x: float(x.get('conf', 0.0)))
+        # 各尺度候选映射回原图后做 NMS 合并，同一块车牌的多次检测按置信度投票定文字
+        with span(trace, 'postprocess'):
+            plates = merge_plate_candidates(candidates, enhanced_img.shape)
 
-        plate_str = postprocess_plate(best.get('plate', '') or '')
-        plate_str = correct_plate_string(plate_str)
+        found = []
+        for p in plates:
+            plate_str, status, plate_color, plate_type = _classify_plate(ctx, p['plate'], p['bbox'], trace)
+            if plate_str:
+                found.append({'plate': plate_str, 'color': plate_color, 'type': plate_type,
+                              'bbox': p['bbox'], 'conf': p['conf'], 'votes': p['votes']})
+        if not found:
+            return None, "识别失败(异常车牌)", None, None
 
-        mapped_bbox = _map_bbox_to_original(best.get('bbox'), best.get('scale', 1.0), enhanced_img.shape)
+        best = found[0]
+        if stats is not None:
+            stats['bbox'] = best['bbox']
+            stats['conf'] = best['conf']
+            stats['plates'] = found
+        return best['plate'], "识别成功", best['color'], best['type']
+    except Exception as e:
+        return None, f"识别错误：{str(e)}", None, None
 
-        # 先判断是否为左黄右绿的新能源大型车牌
-        if mapped_bbox and is_split_yellow_green_plate(enhanced_img, mapped_bbox):
-            plate_type = "新能源大型客车"
-            plate_color = '新能源绿黄'
+# 单块车牌：颜色、类型判定与格式检查
+def _classify_plate(ctx, plate_str, mapped_bbox, trace=None):
+    enhanced_img = ctx.enhanced
+    # 车牌区域只转换一次 HSV、查表一次颜色位掩码，供左黄右绿判断与颜色判定共用
+    with span(trace, 'color'):
+        codes = plate_hsv = None
+        if mapped_bbox:
+            plate_hsv = ctx.plate_hsv(mapped_bbox)
+            codes = plate_color_codes(plate_hsv)
+        is_split = bool(mapped_bbox) and is_split_yellow_green_plate(enhanced_img, mapped_bbox, codes=codes)
+        if not is_split:
+            plate_color = get_plate_color(enhanced_img, mapped_bbox, codes=codes, plate_hsv=plate_hsv)
+
+    # 先判断是否为左黄右绿的新能源大型车牌
+    if is_split:
+        plate_type = "新能源大型客车"
+        plate_color = '新能源绿黄'
+    else:
+        # 特殊车牌类型判断
+        plate_type = "普通车牌"
+        # 军用白牌：以两个拉丁大写字母开头（例如 KZ12345）
+        if re.match(r'^[A-Z]{2}\d+', plate_str):
+            plate_type = "军用白牌"
         else:
-            plate_color = get_plate_color(enhanced_img, mapped_bbox)
+            for char, type_name in SPECIAL_PLATE_TYPES.items():
+                if char in plate_str:
+                    plate_type = type_name
+                    break
 
-            # 特殊车牌类型判断
-            plate_type = "普通车牌"
-            # 军用白牌：以两个拉丁大写字母开头（例如 KZ12345）
-            if re.match(r'^[A-Z]{2}\d+', plate_str):
-                plate_type = "军用白牌"
-            else:
-                for char, type_name in SPECIAL_PLATE_TYPES.items():
-                    if char in plate_str:
-                        plate_type = type_name
-                        break
+    if plate_type == "军用白牌" or (isinstance(plate_type, str) and "警" in plate_type):
+        plate_color = "白色"
 
-        if plate_type == "军用白牌" or (isinstance(plate_type, str) and "警" in plate_type):
-            plate_color = "白色"
+    valid_format, expected_fmt, fmt_note = check_plate_number_format(plate_str, plate_color)
+    if not valid_format:
+        return None, "识别失败(异常车牌)", None, None
+    return plate_str, "识别成功", plate_color, plate_type
 
-        valid_format, expected_fmt, fmt_note = check_plate_number_format(plate_str, plate_color)
-        if not valid_format:
-            return None, "识别失败(异常车牌)", None, None
+# 各尺度检测框两两 IoU（向量化），boxes 为 (n, 4) 的 x1, y1, x2, y2
+def _iou_matrix(boxes):
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    area = (x2 - x1) * (y2 - y1)
+    iw = np.clip(np.minimum(x2[:, None], x2[None, :]) - np.maximum(x1[:, None], x1[None, :]), 0, None)
+    ih = np.clip(np.minimum(y2[:, None], y2[None, :]) - np.maximum(y1[:, None], y1[None, :]), 0, None)
+    inter = iw * ih
+    union = area[:, None] + area[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
 
-        return plate_str, "识别成功", plate_color, plate_type
-    except Exception as e:
-        return None, f"识别错误：{str(e)}", None, None
+# 候选合并：框映射到原图后按置信度做贪心 NMS，每组内以置信度加权投票决定车牌文字
+# 返回按置信度降序的 [{'plate', 'conf', 'bbox', 'votes'}]；没有框的候选归为一组
+def merge_plate_candidates(candidates, img_shape, iou_threshold=NMS_IOU_THRESHOLD):
+    texts = [correct_plate_string(postprocess_plate(c.get('plate', '') or '')) for c in candidates]
+    confs = np.array([float(c.get('conf', 0.0)) for c in candidates])
+    mapped = [_map_bbox_to_original(c.get('bbox'), c.get('scale', 1.0), img_shape) for c in candidates]
 
-def batch_process(folder_path):
-    """批量处理文件夹中的图片"""
-    image_paths = []
-    for ext in ('*.jpg', '*.jpeg', '*.png', '*.bmp'):
-        image_paths.extend(glob.glob(os.path.join(folder_path, ext)))
-    
-    if not image_paths:
-        print("未找到图片文件！")
-        return []
+    groups = []
+    with_box = [i for i, b in enumerate(mapped) if b]
+    if with_box:
+        boxes = np.array([mapped[i] for i in with_box], dtype=np.float64)
+        iou = _iou_matrix(boxes)
+        order = np.argsort(-confs[with_box], kind='stable')
+        suppressed = np.zeros(len(with_box), dtype=bool)
+        for k in order:
+            if suppressed[k]:
+                continue
+            members = np.flatnonzero((iou[k] >= iou_threshold) & ~suppressed)
+            suppressed[members] = True
+            groups.append((with_box[k], [with_box[m] for m in members]))
+    no_box = [i for i, b in enumerate(mapped) if not b]
+    if no_box:
+        keeper = max(no_box, key=lambda i: confs[i])
+        groups.append((keeper, no_box))
 
-    results = []
-    for img_path in image_paths:
-        img_name = os.path.basename(img_path)
-        plate, status, color, plate_type = recognize_plate(img_path)
-        # 所属地区判定
-        if plate_type == "军用白牌":
-            location = "军区"
-        else:
-            if plate:
-                first = plate[0]
-                if first in PROVINCE_MAP:
-                    location = PROVINCE_MAP.get(first, "未知")
-                elif re.match(r'^[A-Z]', plate):
-                    location = "外牌/特殊"
-                else:
-                    location = "未知"
+    plates = []
+    for keeper, members in groups:
+        votes = {}
+        for m in members:
+            if texts[m]:
+                votes[texts[m]] = votes.get(texts[m], 0.0) + confs[m]
+        if not votes:
+            continue
+        plates.append({'plate': max(votes, key=votes.get), 'conf': float(confs[keeper]),
+                       'bbox': mapped[keeper], 'votes': len(members)})
+    plates.sort(key=lambda p: -p['conf'])
+    return plates
+
+# 调参脚本（tune.py）可调整的模块级参数及其默认值；每次 apply_config 都从默认值出发
+TUNABLES = ('DEFAULT_SCALES', 'COLOR_MIN_RATIO', 'ENHANCE_S_BOOST', 'ENHANCE_V_BOOST',
+            'CLAHE_CLIP_LIMIT', 'CLAHE_TILE_GRID')
+_TUNABLE_DEFAULTS = {name: globals()[name] for name in TUNABLES}
+
+# 增强幅度的几档预设：(S 提升, V 提升)
+ENHANCE_PRESETS = {
+    'off': ({'blue': 0, 'green': 0, 'red': 0}, {'blue': 0, 'green': 0, 'red': 0}),
+    'default': (dict(ENHANCE_S_BOOST), dict(ENHANCE_V_BOOST)),
+    'strong': ({'blue': 50, 'green': 10, 'red': 10}, {'blue': 10, 'green': 35, 'red': 45}),
+}
+
+def apply_config(config):
+    """按 tune.py 的一组配置设置模块级参数（未给出的项恢复默认值），返回 (置信度阈值, 检测选项)。
+    clahe 为 [clipLimit, tile 边长] 时设置 CLAHE 参数并开启检测选项 'clahe'。
+    """
+    global DEFAULT_SCALES, COLOR_MIN_RATIO, ENHANCE_S_BOOST, ENHANCE_V_BOOST, CLAHE_CLIP_LIMIT, CLAHE_TILE_GRID
+    _set_tunables(_TUNABLE_DEFAULTS)
+    DEFAULT_SCALES = tuple(config.get('scales', DEFAULT_SCALES))
+    COLOR_MIN_RATIO = config.get('color_min_ratio', COLOR_MIN_RATIO)
+    ENHANCE_S_BOOST, ENHANCE_V_BOOST = ENHANCE_PRESETS[config.get('enhance', 'default')]
+    options = {}
+    clahe = config.get('clahe')
+    if clahe:
+        CLAHE_CLIP_LIMIT = float(clahe[0])
+        CLAHE_TILE_GRID = (int(clahe[1]), int(clahe[1]))
+        options['clahe'] = True
+    return config.get('conf_threshold', SCALE_CONF_THRESHOLD), options
+
+def load_tuned_config(path):
+    """读取 tune.py -o 输出的 JSON，取帕累托前沿第一项（车牌准确率最高）的配置；
+    文件也可以直接是一组配置（键同 tune.DEFAULT_GRID）。
+    """
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    if 'pareto_front' in data:
+        if not data['pareto_front']:
+            raise ValueError(f"调参结果中没有配置: {path}")
+        return data['pareto_front'][0]['config']
+    return data
+
+def _current_tunables():
+    return {name: globals()[name] for name in TUNABLES}
+
+def _set_tunables(values):
+    globals().update(values)
+
+# 进程池中每个 worker 自己的尺度调度器（由 _init_worker 创建）
+_worker_scheduler = None
+
+# 进程池 worker 初始化：每个进程只加载一次 HyperLPR 模型；wins 为该文件夹保存的尺度命中次数，
+# workers 为进程池大小，各进程的分块线程池按它平分 CPU；
+# tunables 为父进程当前的可调参数（apply_config 的结果），spawn 启动的进程不会继承模块状态
+def _init_worker(conf_threshold=SCALE_CONF_THRESHOLD, wins=None, workers=1, tunables=None):
+    global _worker_scheduler, TILE_THREADS
+    if tunables:
+        _set_tunables(tunables)
+    _worker_scheduler = ScaleScheduler(conf_threshold=conf_threshold, wins=wins)
+    TILE_THREADS = max(1, (os.cpu_count() or 4) // max(1, workers))
+    # 多进程下限制 OpenCV 内部线程，避免 N 个进程 × M 个线程争抢 CPU
+    try:
+        cv2.setNumThreads(1)
+    except Exception:
+        pass
+    # 用一张小黑图预热模型，首张真实图片不再承担加载开销
+    try:
+        HyperLPR_plate_recognition(np.zeros((64, 64, 3), dtype=np.uint8))
+    except Exception:
+        pass
+
+# 单张图片：识别 + 地区/类型判定，返回一行结果
+# instrument=True 时结果行带 '_trace'（各阶段耗时等），with_scale=True 时带 '_scale'（命中尺度），
+# 均由 iter_process 取出汇总，不写入缓存
+def process_image(img_path, scheduler=None, instrument=False, options=None, with_scale=False):
+    img_name = os.path.basename(img_path)
+    stats = {'hyperlpr_calls': 0}
+    if instrument:
+        stats['trace'] = Trace()
+    plate, status, color, plate_type = recognize_plate(img_path, scheduler=scheduler or _worker_scheduler,
+                                                       stats=stats, options=options)
+    row = build_result_row(img_name, plate, status, color, plate_type, stats['hyperlpr_calls'],
+                           plates=stats.get('plates'))
+    if 'tiles' in stats:
+        row['分块数'] = stats['tiles']
+        row['分块耗时(ms)'] = stats['tile_ms']
+    if with_scale and 'best_scale' in stats:
+        row['_scale'] = stats['best_scale']
+    if instrument:
+        if plate is None:
+            stats['trace'].fail(status)
+        row['_trace'] = stats['trace'].to_dict()
+    return row
+
+# 内存中的图片数据（HTTP 上传、压缩包成员等）识别，返回与 process_image 相同的一行结果
+def process_image_bytes(data, img_name='', scheduler=None, options=None, instrument=False, with_scale=False):
+    stats = {'hyperlpr_calls': 0}
+    if instrument:
+        stats['trace'] = Trace()
+    with span(stats.get('trace'), 'imread'):
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        plate, status, color, plate_type = None, "无法读取图片", None, None
+    else:
+        plate, status, color, plate_type = recognize_image(image, img_name,
+                                                           scheduler=scheduler or _worker_scheduler,
+                                                           stats=stats, options=options)
+    row = build_result_row(img_name, plate, status, color, plate_type, stats['hyperlpr_calls'],
+                           plates=stats.get('plates'))
+    if with_scale and 'best_scale' in stats:
+        row['_scale'] = stats['best_scale']
+    if instrument:
+        if plate is None:
+            stats['trace'].fail(status)
+        row['_trace'] = stats['trace'].to_dict()
+    return row
+
+# 由识别结果生成一行输出：所属地区与展示用车辆类型
+# plates：recognize_image 写入 stats['plates'] 的全部车牌；多于一块时行内附 '全部车牌' 列表
+def build_result_row(img_name, plate, status, color, plate_type, hyperlpr_calls=0, plates=None):
+    # 所属地区判定
+    if plate_type == "军用白牌":
+        location = "军区"
+    else:
+        if plate:
+            first = plate[0]
+            if first in PROVINCE_MAP:
+                location = PROVINCE_MAP.get(first, "未知")
+            elif re.match(r'^[A-Z]', plate):
+                location = "外牌/特殊"
             else:
                 location = "未知"
+        else:
+            location = "未知"
 
-        # 根据颜色与特殊标记映射为用户要求的类型标签
-        display_type = plate_type or "未知"
-        c = (color or "").lower()
-        p = plate or ""
-        # 蓝牌 -> 小型客车
-        if '蓝' in c:
-            display_type = '小型客车'
-        # 黄牌 -> 大型客车，若包含 '学' 则为教练车
-        elif '黄' in c:
-            if '学' in p:
-                display_type = '教练车'
-            else:
-                display_type = '大型客车'
-        # 白牌 -> 军用车辆或警用车辆
-        elif '白' in c or plate_type == '军用白牌' or '军用' in (plate_type or ''):
-            if '警' in p or ('警' in (plate_type or '')):
-                display_type = '警用车辆'
+    # 根据颜色与特殊标记映射为用户要求的类型标签
+    display_type = plate_type or "未知"
+    c = (color or "").lower()
+    p = plate or ""
+    # 蓝牌 -> 小型客车
+    if '蓝' in c:
+        display_type = '小型客车'
+    # 黄牌 -> 大型客车，若包含 '学' 则为教练车
+    elif '黄' in c:
+        if '学' in p:
+            display_type = '教练车'
+        else:
+            display_type = '大型客车'
+    # 白牌 -> 军用车辆或警用车辆
+    elif '白' in c or plate_type == '军用白牌' or '军用' in (plate_type or ''):
+        if '警' in p or ('警' in (plate_type or '')):
+            display_type = '警用车辆'
+        else:
+            display_type = '军用车辆'
+    # 新能源分为小型/大型：若 earlier 识别为新能源大型车辆 则为新能源大型客车
+    elif plate_type == '新能源大型车辆' or '新能源大型' in (plate_type or ''):
+        display_type = '新能源大型客车'
+    elif '新能源' in (color or '') or '绿' in c:
+        display_type = '新能源小型客车'
+
+    row = {
+        "图片名称": img_name,
+        "识别结果": plate or "未识别",
+        "车牌颜色": color or "未知",
+        "车牌类型": display_type,
+        "所属地区": location,
+        "状态": status,
+        "检测调用次数": hyperlpr_calls
+    }
+    if plates and len(plates) > 1:
+        all_plates = []
+        for p in plates:
+            sub = build_result_row(img_name, p['plate'], status, p['color'], p['type'])
+            all_plates.append({
+                "识别结果": sub["识别结果"],
+                "车牌颜色": sub["车牌颜色"],
+                "车牌类型": sub["车牌类型"],
+                "所属地区": sub["所属地区"],
+                "置信度": round(p['conf'], 4),
+                "位置": list(p['bbox']) if p['bbox'] else None
+            })
+        row["全部车牌"] = all_plates
+    return row
+
+# 逐条列出文件夹中的图片（os.scandir 惰性遍历，不一次性构建完整列表）
+def _scan_images(folder_path):
+    with os.scandir(folder_path) as it:
+        for entry in it:
+            if entry.name.lower().endswith(IMAGE_EXTS) and entry.is_file():
+                yield entry.path
+
+# 结果行中的图片名称：文件取文件名，压缩包成员取包内路径
+def _source_name(src):
+    return os.path.basename(src) if isinstance(src, str) else src.name
+
+# 感知哈希（dHash）：JPEG 按 1/8 尺寸解码为灰度图，缩到 9x8 后比较相邻像素，得到 64 位整数。
+# 无法解码时返回 None（不参与去重）
+def image_dhash(src):
+    if isinstance(src, str):
+        gray = cv2.imread(src, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    else:
+        gray = cv2.imdecode(np.frombuffer(src.data, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if gray is None:
+        return None
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = np.packbits(small[:, 1:] > small[:, :-1])
+    return int.from_bytes(bits.tobytes(), 'big')
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+# 识别错误（如读取异常）不写入缓存，下次重试
+def _cacheable(result):
+    return not str(result.get('状态', '')).startswith('识别错误')
+
+def _warn_cache_unavailable(cache, e):
+    print(f"警告：结果缓存不可用（{e}），本次不读写缓存")
+    if cache is not None:
+        try:
+            cache.close()
+        except sqlite3.Error:
+            pass
+
+def iter_process(folder_path, workers=1, conf_threshold=SCALE_CONF_THRESHOLD,
+                 use_cache=True, rebuild_cache=False, paths=None, executor=None, scheduler=None,
+                 metrics_path=None, options=None, dedup=None):
+    """逐张产出识别结果（dict，字段同 batch_process），顺序与文件遍历顺序一致。
+    内存占用与文件夹大小无关：路径按批读取，进程池中同时在途的任务数与排队待产出的结果数都有上限。
+    folder_path 也可以是 zip / tar 压缩包：成员在后台线程中预读到内存直接解码，不解压到磁盘，
+    结果的图片名称为包内路径，缓存放在压缩包所在目录；
+    paths：指定要处理的图片路径（默认遍历 folder_path）；
+    executor / scheduler：由调用方复用的进程池 / 尺度调度器（watch 模式下跨轮次保持模型常驻）；
+    metrics_path：开启逐图记录，事件以 JSONL 追加写入该文件，结束时追加一条直方图汇总；
+    options：检测选项（如 {'coarse_to_fine': True}），会计入缓存指纹；
+    开启缓存时各尺度的命中次数也保存在缓存库中，下次处理该文件夹时尺度调度从上次的顺序开始；
+    dedup：汉明距离阈值（如 DEDUP_HAMMING），开启连拍去重：与最近 DEDUP_WINDOW 张已识别图片 dHash
+    足够接近的图片复用其结果，行内 '去重来源' 为被复用的图片名称（None 为关闭）。
+    """
+    options = options or {}
+    archive = is_archive(folder_path) and os.path.isfile(folder_path)
+    if paths is None:
+        paths = iter_archive_images(folder_path) if archive else _scan_images(folder_path)
+
+    cache = None
+    if use_cache:
+        # 调参脚本（tune.py）可改的模块级参数也计入指纹，换用调出的配置后旧结果不再命中
+        fingerprint = config_fingerprint(version=PIPELINE_VERSION, scales=DEFAULT_SCALES,
+                                         conf_threshold=conf_threshold, options=options,
+                                         color_min_ratio=COLOR_MIN_RATIO, color_fallback_ratio=COLOR_FALLBACK_RATIO,
+                                         enhance_s=ENHANCE_S_BOOST, enhance_v=ENHANCE_V_BOOST,
+                                         clahe=(CLAHE_CLIP_LIMIT, CLAHE_TILE_GRID))
+        # 只读的挂载目录（相机存储卡、NFS 共享等）无法建立缓存库：给出提示，照常识别
+        try:
+            cache = open_folder_cache(os.path.dirname(os.path.abspath(folder_path)) if archive else folder_path,
+                                      fingerprint)
+            if rebuild_cache:
+                cache.clear()
+            saved_wins = cache.scale_wins()
+        except (sqlite3.Error, OSError) as e:
+            _warn_cache_unavailable(cache, e)
+            cache = None
+    if cache is None:
+        saved_wins = {}
+    new_wins = {}
+    own_executor = None
+    workers = max(1, int(workers or 1))
+    if executor is None and workers > 1:
+        executor = own_executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                      initargs=(conf_threshold, saved_wins, workers,
+                                                                _current_tunables()))
+    own_scheduler = executor is None and scheduler is None
+    if own_scheduler:
+        scheduler = ScaleScheduler(conf_threshold=conf_threshold, wins=saved_wins)
+
+    # 在途任务上限：足够让每个进程都有活干，又不会把整个文件夹塞进队列；
+    # 排队上限另算：缓存命中、去重的行不占进程，但队首慢任务未完成前也不能产出，同样要限量
+    window = workers * 4
+    max_pending = window * 2
+    pending = deque()  # (路径, 缓存键, 缓存结果, future, 去重信息)
+    in_flight = 0
+    to_store = []
+    hits = 0
+    # 去重：recent 为最近识别的 (dHash, 结果槽)，结果槽在该图完成时写入；
+    # 结果按顺序产出，复用它的重复图出队时结果必已就绪
+    recent = deque(maxlen=DEDUP_WINDOW)
+    deduped = 0
+    saved_calls = 0
+    instrument = metrics_path is not None
+    aggregator = TraceAggregator(metrics_path) if instrument else None
+
+    def finish(item):
+        nonlocal in_flight, hits, deduped, saved_calls
+        path, key, cached, fut, dup = item
+        try:
+            if dup is not None and dup[0] == 'dup':
+                deduped += 1
+                origin = dup[1][0]
+                saved_calls += origin.get('检测调用次数', 0)
+                r = dict(origin)
+                r['图片名称'] = _source_name(path)
+                r['检测调用次数'] = 0
+                r['去重来源'] = origin['图片名称']
+                return r
+            if cached is not None:
+                hits += 1
+                # 内容相同的图片可能换过文件名；命中缓存时本次未调用检测器
+                r = dict(cached)
+                r['图片名称'] = _source_name(path)
+                r['检测调用次数'] = 0
+                if aggregator is not None:
+                    aggregator.add(r['图片名称'], {'stages': {}, 'counters': {'cache_hit': 1}, 'failure': None})
+                return r
+            if fut is not None:
+                in_flight -= 1
+                r = fut.result()
+            elif isinstance(path, str):
+                r = process_image(path, scheduler=scheduler, instrument=instrument, options=options,
+                                  with_scale=True)
             else:
-                display_type = '军用车辆'
-        # 新能源分为小型/大型：若 earlier 识别为新能源大型车辆 则为新能源大型客车
-        elif plate_type == '新能源大型车辆' or '新能源大型' in (plate_type or ''):
-            display_type = '新能源大型客车'
-        elif '新能源' in (color or '') or '绿' in c:
-            display_type = '新能源小型客车'
-
-        results.append({
-            "图片名称": img_name,
-            "识别结果": plate or "未识别",
-            "车牌颜色": color or "未知",
-            "车牌类型": display_type,
-            "所属地区": location,
-            "状态": status
-        })
-    return results
\ No newline at end of file
+                r = process_image_bytes(path.data, path.name, scheduler=scheduler, options=options,
+                                        instrument=instrument, with_scale=True)
+            scale = r.pop('_scale', None)
+            if scale is not None:
+                new_wins[scale] = new_wins.get(scale, 0) + 1
+            trace = r.pop('_trace', None)
+            if aggregator is not None and trace is not None:
+                aggregator.add(r['图片名称'], trace)
+            if dup is not None:
+                dup[1][0] = r
+            if cache is not None and _cacheable(r):
+                to_store.append((key, r))
+                if len(to_store) >= 256:
+                    try:
+                        cache.put_many(to_store)
+                    except sqlite3.Error as e:
+                        drop_cache(e)
+                    to_store.clear()
+            return r
+        finally:
+            # 压缩包成员的图片字节在该行产出后即可释放，内存只随在途的成员数增长
+            if not isinstance(path, str):
+                path.data = None
+
+    # 运行中缓存库不可写（如已有缓存文件但目录只读）：提示一次，本次余下的图片不再使用缓存
+    def drop_cache(e):
+        nonlocal cache
+        _warn_cache_unavailable(cache, e)
+        cache = None
+
+    # 每批先整体查缓存；压缩包成员连同图片字节进入批次，批大小与预读深度一致，避免一次读入过多成员
+    batch_size = PREFETCH_DEPTH if archive else 256
+    try:
+        batch = []
+        for path in itertools.chain(paths, [None]):
+            if path is not None:
+                batch.append(path)
+                if len(batch) < batch_size:
+                    continue
+            if not batch:
+                break
+            keys = [None] * len(batch)
+            cached = {}
+            if cache is not None:
+                keys = [cache.key_for(p) if isinstance(p, str) else cache.key_for_bytes(p.data) for p in batch]
+                try:
+                    cached = cache.get_many(keys)
+                except sqlite3.Error as e:
+                    drop_cache(e)
+            for p, k in zip(batch, keys):
+                # dup：('dup', 结果槽) 复用已识别图片的结果；('ref', 结果槽) 识别后写入结果槽
+                dup = None
+                if k not in cached and dedup is not None:
+                    h = image_dhash(p)
+                    if h is not None:
+                        for rh, rslot in reversed(recent):
+                            if hamming_distance(h, rh) <= dedup:
+                                dup = ('dup', rslot)
+                                break
+                        else:
+                            dup = ('ref', [None])
+                            recent.append((h, dup[1]))
+                if dup is not None and dup[0] == 'dup':
+                    pending.append((p, k, None, None, dup))
+                elif k in cached:
+                    pending.append((p, k, cached[k], None, None))
+                elif executor is not None:
+                    if isinstance(p, str):
+                        fut = executor.submit(process_image, p, None, instrument, options, True)
+                    else:
+                        fut = executor.submit(process_image_bytes, p.data, p.name, None, options, instrument,
+                                              True)
+                    pending.append((p, k, None, fut, dup))
+                    in_flight += 1
+                else:
+                    pending.append((p, k, None, None, dup))
+                # 保持顺序：只能从队首产出；队首已就绪就立即产出，在途任务满了就等队首完成
+                while pending and (executor is None or in_flight >= window or len(pending) >= max_pending
+                                   or pending[0][3] is None or pending[0][3].done()):
+                    yield finish(pending.popleft())
+            batch = []
+        while pending:
+            yield finish(pending.popleft())
+    finally:
+        if cache is not None:
+            try:
+                if to_store:
+                    cache.put_many(to_store)
+                if new_wins:
+                    cache.add_scale_wins(new_wins)
+                cache.evict()
+                cache.close()
+            except sqlite3.Error as e:
+                _warn_cache_unavailable(cache, e)
+        if own_executor is not None:
+            own_executor.shutdown(cancel_futures=True)
+        # 等后台线程把本批调试图片写完，调用方拿到结果后即可查看
+        if _debug_writer is not None:
+            _debug_writer.flush()
+        if aggregator is not None:
+            summary = aggregator.close()
+            if DEBUG:
+                means = ', '.join(f"{k}={v['mean_ms']}ms" for k, v in summary['stages'].items())
+                print(f"阶段平均耗时: {means}")
+        if DEBUG:
+            if use_cache:
+                print(f"缓存命中 {hits} 张")
+            if dedup is not None:
+                print(f"去重复用 {deduped} 张，节省检测调用 {saved_calls} 次")
+            if own_scheduler:
+                print(f"尺度命中统计: {scheduler.wins}")
+
+def batch_process(folder_path, workers=1, conf_threshold=SCALE_CONF_THRESHOLD,
+                  use_cache=True, rebuild_cache=False, metrics_path=None, options=None, dedup=None,
+                  output_path=None, config=None):
+    """批量处理文件夹（或 zip / tar 压缩包）中的图片，返回 ResultStore（列式存储，
+    可按下标 / 迭代取出与 iter_process 相同的 dict）。
+    workers > 1 时使用进程池并行识别，结果顺序与文件顺序一致。
+    conf_threshold：某一尺度置信度达到该值即不再尝试其它尺度；None 为总是跑完全部尺度。
+    use_cache：按文件内容哈希复用文件夹内缓存的结果，只识别新增或改动的图片；
+    rebuild_cache：清空该文件夹的缓存后重新识别；
+    metrics_path：逐图阶段耗时 / 尺度命中 / 回退 / 失败原因的 JSONL 输出文件，末行为汇总；
+    options：检测选项 dict，见 recognize_image；
+    dedup：连拍去重的汉明距离阈值，见 iter_process；
+    output_path：同时把结果逐行写入该文件（.csv / .jsonl / .parquet）；
+    config：tune.py 调出的一组配置（dict）或其结果 JSON 路径，见 apply_config / load_tuned_config；
+    给出时按它设置模块级参数（之后的调用沿用），其置信度阈值取代 conf_threshold，检测选项并入 options。
+    """
+    if config is not None:
+        if isinstance(config, str):
+            config = load_tuned_config(config)
+        conf_threshold, tuned_options = apply_config(config)
+        options = dict(options or {}, **tuned_options)
+    results = ResultStore()
+    writer = open_result_writer(output_path) if output_path else None
+    try:
+        for row in iter_process(folder_path, workers=workers, conf_threshold=conf_threshold,
+                                use_cache=use_cache, rebuild_cache=rebuild_cache,
+                                metrics_path=metrics_path, options=options, dedup=dedup):
+            results.append(row)
+            if writer is not None:
+                writer.write(row)
+    finally:
+        if writer is not None:
+            writer.close()
+    if not results:
+        print("未找到图片文件！")
+    return results
+
+def watch_folder(folder_path, interval=2.0, settle=1.0, process_existing=True, workers=1,
+                 conf_threshold=SCALE_CONF_THRESHOLD, use_cache=True, options=None, rebuild_cache=False,
+                 metrics_path=None, dedup=None):
+    """监视文件夹，摄像头新写入的图片一出现就识别并产出结果（无限生成器，Ctrl+C 结束）。
+    已处理的文件按 文件名 -> (大小, 修改时间) 记录，每轮与目录列表比对：新文件名或大小 / 修改时间变化的文件
+    才处理，目录中已消失的文件名随即移除，记录数不超过文件夹当前的图片数。
+    因此 rsync -a、cp -p、解压、相机导入等保留原修改时间的文件同样会被发现；
+    最近 settle 秒内修改或改名（ctime）的文件视为未写完，留到下一轮。
+    rebuild_cache 只在第一轮清空缓存；metrics_path 每轮追加逐图记录与一条该轮的汇总；
+    dedup 在每轮新图片内部去重（含义同 iter_process）。
+    """
+    seen = {}
+    if not process_existing:
+        with os.scandir(folder_path) as it:
+            for entry in it:
+                if entry.name.lower().endswith(IMAGE_EXTS) and entry.is_file():
+                    st = entry.stat()
+                    seen[entry.name] = (st.st_size, st.st_mtime_ns)
+    executor = None
+    scheduler = None
+    # 从该文件夹保存的尺度命中次数开始；每轮新的命中由 iter_process 写回缓存
+    wins = read_folder_scale_wins(folder_path) if use_cache and not rebuild_cache else {}
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                       initargs=(conf_threshold, wins, workers, _current_tunables()))
+    else:
+        scheduler = ScaleScheduler(conf_threshold=conf_threshold, wins=wins)
+    try:
+        while True:
+            settle_ns = time.time_ns() - int(settle * 1e9)
+            fresh = []
+            listed = set()
+            with os.scandir(folder_path) as it:
+                for entry in it:
+                    if not entry.name.lower().endswith(IMAGE_EXTS) or not entry.is_file():
+                        continue
+                    listed.add(entry.name)
+                    st = entry.stat()
+                    sig = (st.st_size, st.st_mtime_ns)
+                    if seen.get(entry.name) == sig:
+                        continue
+                    if max(st.st_mtime_ns, st.st_ctime_ns) > settle_ns:
+                        continue
+                    fresh.append((st.st_mtime_ns, entry.name, entry.path, sig))
+            for name in [n for n in seen if n not in listed]:
+                del seen[name]
+            if not fresh:
+                time.sleep(interval)
+                continue
+            # 按修改时间顺序处理
+            fresh.sort()
+            for r in iter_process(folder_path, workers=workers, conf_threshold=conf_threshold,
+                                  use_cache=use_cache, paths=[f[2] for f in fresh],
+                                  executor=executor, scheduler=scheduler, options=options,
+                                  rebuild_cache=rebuild_cache, metrics_path=metrics_path, dedup=dedup):
+                yield r
+            rebuild_cache = False
+            for _, name, _, sig in fresh:
+                seen[name] = sig
+            time.sleep(interval)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
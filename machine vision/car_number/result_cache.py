@@ -0,0 +1,149 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+
+# 缓存文件名（放在图片文件夹内，glob 图片时不会被匹配）
+CACHE_FILENAME = '.plate_cache.sqlite'
+# 默认淘汰策略：超过 30 天未使用，或条目数超过 20 万
+DEFAULT_MAX_AGE_DAYS = 30
+DEFAULT_MAX_ENTRIES = 200000
+# 按文件夹保存的尺度命中次数：总数超过上限时按比例缩小，摄像头调整后新的命中能较快改变顺序
+SCALE_WINS_CAP = 1000
+
+# 文件内容哈希（分块读取，大图不一次性载入）
+def file_digest(path, chunk_size=1 << 20):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+# 内存中数据（压缩包成员等）的内容哈希，与 file_digest 对同样内容的结果一致
+def bytes_digest(data):
+    return hashlib.sha1(data).hexdigest()
+
+# 配置指纹：流水线版本 + 影响结果的参数，任一变化则旧缓存全部失效
+def config_fingerprint(**config):
+    text = json.dumps(config, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+class ResultCache:
+    """按 (文件内容哈希, 配置指纹) 缓存单张图片的识别结果。"""
+
+    def __init__(self, db_path, fingerprint, max_age_days=DEFAULT_MAX_AGE_DAYS,
+                 max_entries=DEFAULT_MAX_ENTRIES):
+        self.db_path = db_path
+        self.fingerprint = fingerprint
+        self.max_age_days = max_age_days
+        self.max_entries = max_entries
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS results ('
+            ' key TEXT PRIMARY KEY,'
+            ' result TEXT NOT NULL,'
+            ' created REAL NOT NULL,'
+            ' last_used REAL NOT NULL)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_last_used ON results(last_used)')
+        # 与配置指纹无关的文件夹级信息（尺度命中次数等）
+        self.conn.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        self.conn.commit()
+
+    def key_for(self, path):
+        return file_digest(path) + ':' + self.fingerprint
+
+    def key_for_bytes(self, data):
+        return bytes_digest(data) + ':' + self.fingerprint
+
+    def get_many(self, keys):
+        """返回 {key: result_dict}，并刷新命中条目的使用时间。"""
+        found = {}
+        keys = list(keys)
+        # SQLite 参数个数有上限，分批查询
+        for i in range(0, len(keys), 500):
+            part = keys[i:i + 500]
+            marks = ','.join('?' * len(part))
+            rows = self.conn.execute(f'SELECT key, result FROM results WHERE key IN ({marks})', part)
+            for key, text in rows:
+                found[key] = json.loads(text)
+        if found:
+            now = time.time()
+            self.conn.executemany('UPDATE results SET last_used = ? WHERE key = ?',
+                                  [(now, k) for k in found])
+            self.conn.commit()
+        return found
+
+    def put_many(self, items):
+        """items: [(key, result_dict), ...]"""
+        now = time.time()
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO results (key, result, created, last_used) VALUES (?, ?, ?, ?)',
+            [(k, json.dumps(r, ensure_ascii=False), now, now) for k, r in items]
+        )
+        self.conn.commit()
+
+    # 淘汰：先按最近使用时间删除过期条目，再按条目上限删除最久未使用的
+    def evict(self):
+        removed = 0
+        if self.max_age_days is not None:
+            cutoff = time.time() - self.max_age_days * 86400
+            removed += self.conn.execute('DELETE FROM results WHERE last_used < ?', (cutoff,)).rowcount
+        if self.max_entries is not None:
+            removed += self.conn.execute(
+                'DELETE FROM results WHERE key IN ('
+                ' SELECT key FROM results ORDER BY last_used DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            ).rowcount
+        self.conn.commit()
+        return removed
+
+    def scale_wins(self):
+        """返回 {尺度: 命中次数}（该文件夹历次运行累计）。"""
+        row = self.conn.execute("SELECT value FROM meta WHERE name = 'scale_wins'").fetchone()
+        if row is None:
+            return {}
+        return {float(k): int(v) for k, v in json.loads(row[0]).items()}
+
+    def add_scale_wins(self, wins):
+        total = self.scale_wins()
+        for s, n in wins.items():
+            total[s] = total.get(s, 0) + n
+        count = sum(total.values())
+        if count > SCALE_WINS_CAP:
+            total = {s: int(round(n * SCALE_WINS_CAP / count)) for s, n in total.items()}
+        self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('scale_wins', ?)",
+                          (json.dumps({str(s): n for s, n in total.items()}),))
+        self.conn.commit()
+
+    def clear(self):
+        self.conn.execute('DELETE FROM results')
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+def open_folder_cache(folder_path, fingerprint, **kwargs):
+    return ResultCache(os.path.join(folder_path, CACHE_FILENAME), fingerprint, **kwargs)
+
+# 读取文件夹缓存中的尺度命中次数；没有缓存文件时返回空 dict（不创建文件）
+def read_folder_scale_wins(folder_path):
+    db_path = os.path.join(folder_path, CACHE_FILENAME)
+    if not os.path.exists(db_path):
+        return {}
+    try:
+        cache = ResultCache(db_path, '')
+    except sqlite3.Error:
+        return {}
+    try:
+        return cache.scale_wins()
+    except sqlite3.Error:
+        return {}
+    finally:
+        cache.close()
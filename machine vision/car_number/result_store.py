@@ -0,0 +1,199 @@
+import csv
+import json
+from array import array
+
+# 识别结果的紧凑存储与流式导出：
+#   ResultStore   列式存储，颜色 / 类型 / 地区 / 状态等取值很少的列只存字典编码，
+#                 几十万行也只占几 MB；按下标或迭代取出时还原为与 batch_process 相同的 dict
+#   ResultStats   逐行累加的统计（成功率、颜色与类型分布、检测调用次数、去重数）
+#   open_result_writer(path)  按扩展名返回 CSV / JSONL / Parquet 流式写入器，边识别边落盘
+
+# 每行都有的列，顺序即 CSV / Parquet 的列顺序
+FIELDS = ('图片名称', '识别结果', '车牌颜色', '车牌类型', '所属地区', '状态', '检测调用次数')
+# 字典编码的列（取值种类少）
+CATEGORICAL = ('车牌颜色', '车牌类型', '所属地区', '状态')
+
+
+def is_success(row):
+    st = row.get('状态')
+    return isinstance(st, str) and st.startswith('识别成功')
+
+
+class ResultStore:
+    """列式结果容器。行 dict 中 FIELDS 以外的键（全部车牌、去重来源等）按行号稀疏保存。"""
+
+    def __init__(self, rows=()):
+        self.names = []
+        self.plates = []
+        self.codes = {c: array('H') for c in CATEGORICAL}
+        self.values = {c: [] for c in CATEGORICAL}
+        self._index = {c: {} for c in CATEGORICAL}
+        self.calls = array('I')
+        self.extras = {}
+        for row in rows:
+            self.append(row)
+
+    def _encode(self, col, value):
+        index = self._index[col]
+        code = index.get(value)
+        if code is None:
+            code = index[value] = len(self.values[col])
+            self.values[col].append(value)
+        return code
+
+    def append(self, row):
+        i = len(self.names)
+        self.names.append(row.get('图片名称'))
+        self.plates.append(row.get('识别结果'))
+        for c in CATEGORICAL:
+            self.codes[c].append(self._encode(c, row.get(c)))
+        self.calls.append(row.get('检测调用次数', 0) or 0)
+        extra = {k: v for k, v in row.items() if k not in FIELDS}
+        if extra:
+            self.extras[i] = extra
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self.names)
+        row = {'图片名称': self.names[i], '识别结果': self.plates[i]}
+        for c in CATEGORICAL:
+            row[c] = self.values[c][self.codes[c][i]]
+        row['检测调用次数'] = self.calls[i]
+        extra = self.extras.get(i)
+        if extra:
+            row.update(extra)
+        return row
+
+    def __iter__(self):
+        for i in range(len(self.names)):
+            yield self[i]
+
+    # 整列取值（列表）
+    def column(self, name):
+        if name == '图片名称':
+            return list(self.names)
+        if name == '识别结果':
+            return list(self.plates)
+        if name == '检测调用次数':
+            return list(self.calls)
+        values = self.values[name]
+        return [values[k] for k in self.codes[name]]
+
+    def stats(self):
+        stats = ResultStats()
+        for row in self:
+            stats.add(row)
+        return stats
+
+
+class ResultStats:
+    """逐行累加的统计，不保留结果本身。"""
+
+    def __init__(self):
+        self.total = 0
+        self.success = 0
+        self.calls = 0
+        self.deduped = 0
+        self.colors = {}
+        self.types = {}
+
+    def add(self, row):
+        self.total += 1
+        self.calls += row.get('检测调用次数', 0) or 0
+        if row.get('去重来源'):
+            self.deduped += 1
+        if is_success(row):
+            self.success += 1
+            color = row.get('车牌颜色', '未知')
+            ptype = row.get('车牌类型', '未知')
+            self.colors[color] = self.colors.get(color, 0) + 1
+            self.types[ptype] = self.types.get(ptype, 0) + 1
+
+    @property
+    def success_rate(self):
+        return self.success / self.total if self.total else 0.0
+
+    @property
+    def calls_per_image(self):
+        return self.calls / self.total if self.total else 0.0
+
+    def to_dict(self):
+        return {'total': self.total, 'success': self.success, 'success_rate': round(self.success_rate, 4),
+                'hyperlpr_calls': self.calls, 'deduped': self.deduped,
+                'colors': self.colors, 'types': self.types}
+
+
+class CsvResultWriter:
+    """每行写 FIELDS 各列；多车牌等附加信息以 JSON 字符串写在末列。"""
+
+    def __init__(self, path):
+        self.f = open(path, 'w', encoding='utf-8-sig', newline='')
+        self.writer = csv.writer(self.f)
+        self.writer.writerow(FIELDS + ('附加信息',))
+
+    def write(self, row):
+        extra = {k: v for k, v in row.items() if k not in FIELDS}
+        self.writer.writerow([row.get(k, '') for k in FIELDS] +
+                             [json.dumps(extra, ensure_ascii=False) if extra else ''])
+
+    def close(self):
+        self.f.close()
+
+
+class JsonlResultWriter:
+    def __init__(self, path):
+        self.f = open(path, 'w', encoding='utf-8')
+
+    def write(self, row):
+        self.f.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+    def close(self):
+        self.f.close()
+
+
+class ParquetResultWriter:
+    """按 batch_size 行攒成一个行组写出，内存只保留一个行组。需要 pyarrow。"""
+
+    def __init__(self, path, batch_size=50000):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("写 Parquet 需要安装 pyarrow（pip install pyarrow）")
+        self.pa = pa
+        self.schema = pa.schema([(k, pa.int32() if k == '检测调用次数' else pa.string()) for k in FIELDS] +
+                                [('附加信息', pa.string())])
+        self.writer = pq.ParquetWriter(path, self.schema)
+        self.batch_size = batch_size
+        self.columns = {k: [] for k in self.schema.names}
+
+    def write(self, row):
+        for k in FIELDS:
+            self.columns[k].append(row.get(k))
+        extra = {k: v for k, v in row.items() if k not in FIELDS}
+        self.columns['附加信息'].append(json.dumps(extra, ensure_ascii=False) if extra else None)
+        if len(self.columns['图片名称']) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if self.columns['图片名称']:
+            self.writer.write_table(self.pa.table(self.columns, schema=self.schema))
+            self.columns = {k: [] for k in self.schema.names}
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+
+
+WRITERS = {'.csv': CsvResultWriter, '.jsonl': JsonlResultWriter, '.parquet': ParquetResultWriter}
+
+
+def open_result_writer(path):
+    ext = path[path.rfind('.'):].lower() if '.' in path else ''
+    cls = WRITERS.get(ext)
+    if cls is None:
+        raise ValueError(f"不支持的输出格式：{path}（可用 {', '.join(WRITERS)}）")
+    return cls(path)
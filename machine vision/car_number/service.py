@@ -0,0 +1,240 @@
+import os
+import sys
+import json
+import asyncio
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+import plate_recognition as pr
+
+# 本地车牌识别服务：模型常驻在进程池中，并发请求合并成小批次送入 worker。
+#   POST /recognize   请求体为图片字节（Content-Type: image/*，检测选项可放在 X-Options 头中，JSON 格式），
+#                     或 JSON {"path": "本地图片路径", "options": {...}}；返回与 batch_process 相同字段的 JSON
+#   GET  /health      存活检查
+#   POST /shutdown    停止服务
+# 也可用 --unix 监听 Unix 套接字；main.py --daemon 即以这种方式在后台常驻本服务。
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# 一个批次最多合并的请求数，以及凑批最多等待的时间。
+# 批次在一个 worker 内逐张识别，合并只省进程间往返，不能让空闲 worker 闲着：
+# 批大小取 积压请求数 / 空闲 worker 数（向上取整），只有全部 worker 都在忙时才等待凑批
+MAX_BATCH = 8
+MAX_WAIT_MS = 5
+# 请求体上限，防止误传超大文件
+MAX_BODY = 32 * 1024 * 1024
+
+
+# 在 worker 进程中识别一个批次：一次进程间通信处理多张图片
+def recognize_batch(items):
+    out = []
+    for kind, value, name, options in items:
+        try:
+            if kind == 'path':
+                out.append(pr.process_image(value, options=options))
+            else:
+                out.append(pr.process_image_bytes(value, name, options=options))
+        except Exception as e:
+            out.append(pr.build_result_row(name, None, f"识别错误：{str(e)}", None, None))
+    return out
+
+
+class MicroBatcher:
+    """把并发到达的请求分成批次交给进程池；同时在途的批次数不超过 worker 数。
+    积压的请求平均分给空闲的 worker，只有最后一个空闲 worker 才等待 max_wait 凑批。"""
+
+    def __init__(self, executor, workers, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = asyncio.Queue()
+        self.slots = asyncio.Semaphore(workers)
+        self.idle = workers
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, kind, value, name, options=None):
+        fut = asyncio.get_running_loop().create_future()
+        await self.queue.put(((kind, value, name, options), fut))
+        return await fut
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # 有空闲 worker 时才取请求，忙时请求在队列里自然越攒越多
+            await self.slots.acquire()
+            self.idle -= 1
+            batch = [await self.queue.get()]
+            # 本 worker 与其余空闲 worker 平分积压：还有别的 worker 空闲时立即派发，不等待
+            free = self.idle + 1
+            size = min(self.max_batch, -(-(1 + self.queue.qsize()) // free))
+            while len(batch) < size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            if self.idle == 0:
+                # 其余 worker 都在忙：新到的请求本来也要排队，合并进本批次省一次进程间往返
+                deadline = loop.time() + self.max_wait
+                while len(batch) < self.max_batch:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+            self.batches += 1
+            self.items += len(batch)
+            loop.create_task(self._dispatch(batch))
+
+    async def _dispatch(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.executor, recognize_batch, [b[0] for b in batch])
+            for (_, fut), r in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(r)
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+        finally:
+            self.idle += 1
+            self.slots.release()
+
+
+def _response(status, payload, keep_alive=True):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 413: 'Payload Too Large',
+              500: 'Internal Server Error'}.get(status, 'OK')
+    head = (f"HTTP/1.1 {status} {reason}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode('latin-1') + body
+
+
+async def handle_connection(reader, writer, batcher, info=None, stop=None):
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                method, target, _ = line.decode('latin-1').split(' ', 2)
+            except ValueError:
+                writer.write(_response(400, {'error': '请求行格式错误'}, keep_alive=False))
+                break
+            headers = {}
+            while True:
+                h = await reader.readline()
+                if h in (b'\r\n', b'\n', b''):
+                    break
+                k, _, v = h.decode('latin-1').partition(':')
+                headers[k.strip().lower()] = v.strip()
+            length = int(headers.get('content-length') or 0)
+            keep_alive = headers.get('connection', '').lower() != 'close'
+            if length > MAX_BODY:
+                writer.write(_response(413, {'error': '请求体过大'}, keep_alive=False))
+                break
+            body = await reader.readexactly(length) if length else b''
+
+            path = target.split('?', 1)[0]
+            if method == 'GET' and path == '/health':
+                payload = {'status': 'ok', 'batches': batcher.batches, 'items': batcher.items}
+                payload.update(info or {})
+                resp = _response(200, payload, keep_alive)
+            elif method == 'POST' and path == '/shutdown' and stop is not None:
+                resp = _response(200, {'status': 'stopping'}, keep_alive=False)
+                keep_alive = False
+                stop.set()
+            elif method == 'POST' and path == '/recognize':
+                ctype = headers.get('content-type', '')
+                if ctype.startswith('application/json'):
+                    try:
+                        req = json.loads(body.decode('utf-8'))
+                        image_path = req['path']
+                    except Exception:
+                        resp = _response(400, {'error': '需要 JSON {"path": ...}'}, keep_alive)
+                    else:
+                        r = await batcher.submit('path', image_path, os.path.basename(image_path),
+                                                 req.get('options'))
+                        resp = _response(200, r, keep_alive)
+                elif body:
+                    name = headers.get('x-image-name', '')
+                    try:
+                        options = json.loads(headers['x-options']) if headers.get('x-options') else None
+                    except ValueError:
+                        resp = _response(400, {'error': 'X-Options 需要是 JSON'}, keep_alive)
+                    else:
+                        r = await batcher.submit('bytes', body, name, options)
+                        resp = _response(200, r, keep_alive)
+                else:
+                    resp = _response(400, {'error': '请求体为空'}, keep_alive)
+            else:
+                resp = _response(404, {'error': '未知路径'}, keep_alive)
+            writer.write(resp)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionResetError):
+        pass
+    except Exception as e:
+        try:
+            writer.write(_response(500, {'error': str(e)}, keep_alive=False))
+            await writer.drain()
+        except Exception:
+            pass
+    finally:
+        writer.close()
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None, workers=None,
+                conf_threshold=pr.SCALE_CONF_THRESHOLD, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+    workers = workers or os.cpu_count() or 1
+    pr.DEBUG = False
+    with ProcessPoolExecutor(max_workers=workers, initializer=pr._init_worker,
+                             initargs=(conf_threshold, None, workers)) as executor:
+        batcher = MicroBatcher(executor, workers, max_batch=max_batch, max_wait_ms=max_wait_ms)
+        batch_task = asyncio.get_running_loop().create_task(batcher.run())
+        info = {'pid': os.getpid(), 'workers': workers, 'conf_threshold': conf_threshold}
+        stop = asyncio.Event()
+
+        async def on_connect(reader, writer):
+            await handle_connection(reader, writer, batcher, info, stop)
+
+        if unix_path:
+            server = await asyncio.start_unix_server(on_connect, path=unix_path)
+            where = unix_path
+        else:
+            server = await asyncio.start_server(on_connect, host, port)
+            where = f"http://{host}:{port}"
+        print(f"车牌识别服务已启动: {where}（{workers} 个 worker，批大小 ≤{max_batch}）", flush=True)
+        try:
+            async with server:
+                await stop.wait()
+        finally:
+            batch_task.cancel()
+            if unix_path and os.path.exists(unix_path):
+                os.remove(unix_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地车牌识别服务（模型常驻 + 微批处理）")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', metavar='PATH', help="监听 Unix 套接字而非 TCP 端口")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="识别进程数（默认 CPU 核数）")
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH, help=f"单批最多请求数（默认 {MAX_BATCH}）")
+    parser.add_argument('--max-wait-ms', type=float, default=MAX_WAIT_MS,
+                        help=f"凑批最长等待毫秒数（默认 {MAX_WAIT_MS}）")
+    parser.add_argument('--conf-threshold', type=float, default=pr.SCALE_CONF_THRESHOLD)
+    parser.add_argument('--all-scales', action='store_true', help="总是跑完所有尺度（关闭提前结束）")
+    args = parser.parse_args()
+    conf_threshold = None if args.all_scales else args.conf_threshold
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.workers, conf_threshold,
+                          args.max_batch, args.max_wait_ms))
+    except KeyboardInterrupt:
+        pass
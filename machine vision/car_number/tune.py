@@ -0,0 +1,178 @@
+import os
+import sys
+import csv
+import json
+import time
+import random
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import plate_recognition as pr
+
+# 流水线参数调优：在带标注的图片文件夹上并行评估多组参数，
+# 统计车牌准确率、颜色准确率与吞吐量（张/秒），输出帕累托前沿供各摄像头挑选配置。
+#   python tune.py 标注文件夹 -w 4 -o tune.json
+#   python tune.py 标注文件夹 --grid grid.json --max-configs 20
+# 标注文件默认为文件夹内的 labels.csv，列名与 batch_process 的结果相同：
+#   图片名称,识别结果,车牌颜色      （车牌颜色可留空，留空的图片不计入颜色准确率）
+# 因此可以先导出一次识别结果，人工改正后直接作为标注：导出中的占位值 '未识别'（无车牌）读作空车牌，
+# '未知'（颜色未定）读作颜色留空。
+
+LABELS_FILENAME = 'labels.csv'
+# batch_process 导出结果中的占位值
+NO_PLATE = '未识别'
+UNKNOWN_COLOR = '未知'
+
+# 增强幅度的几档预设，见 plate_recognition.ENHANCE_PRESETS
+ENHANCE_PRESETS = pr.ENHANCE_PRESETS
+
+# 默认搜索空间；clahe 为 None 表示检测前不做 CLAHE，否则为 [clipLimit, tile 边长]
+DEFAULT_GRID = {
+    'scales': [[1.0], [1.0, 0.8], [1.0, 0.8, 1.2]],
+    'conf_threshold': [0.9, None],
+    'clahe': [None, [2.0, 8], [3.0, 8]],
+    'color_min_ratio': [0.12, 0.18, 0.25],
+    'enhance': ['off', 'default', 'strong'],
+}
+
+
+def load_labels(folder, labels_path=None):
+    """返回 [(图片路径, 车牌（无车牌为空串）, 颜色或 None), ...]，只保留存在的图片。"""
+    labels_path = labels_path or os.path.join(folder, LABELS_FILENAME)
+    items = []
+    with open(labels_path, encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f):
+            path = os.path.join(folder, row['图片名称'])
+            if os.path.isfile(path):
+                plate = (row.get('识别结果') or '').strip()
+                if plate == NO_PLATE:
+                    plate = ''
+                color = (row.get('车牌颜色') or '').strip()
+                # 没有车牌的图片也没有颜色可评
+                if color == UNKNOWN_COLOR or not plate:
+                    color = ''
+                items.append((path, plate, color or None))
+    return items
+
+
+def expand_grid(grid):
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def apply_config(config):
+    """按配置设置 plate_recognition 的模块级参数（每组配置都从默认值出发，互不影响），
+    返回 (尺度调度器, 检测选项)。"""
+    conf_threshold, options = pr.apply_config(config)
+    return pr.ScaleScheduler(conf_threshold=conf_threshold), options
+
+
+def _init_tuner():
+    pr.DEBUG = False
+    pr.SAVE_DEBUG_IMAGES = False
+
+
+# 在一个进程内用一组配置识别全部标注图片；计时只包含识别本身
+def evaluate(config, items):
+    scheduler, options = apply_config(config)
+    plate_ok = color_ok = color_total = calls = 0
+    t0 = time.perf_counter()
+    for path, plate, color in items:
+        stats = {'hyperlpr_calls': 0}
+        got_plate, _, got_color, _ = pr.recognize_plate(path, scheduler=scheduler, stats=stats, options=options)
+        calls += stats['hyperlpr_calls']
+        if (got_plate or '') == plate:
+            plate_ok += 1
+        if color is not None:
+            color_total += 1
+            if got_color == color:
+                color_ok += 1
+    elapsed = time.perf_counter() - t0
+    n = len(items)
+    return {
+        'config': config,
+        'plate_acc': round(plate_ok / n, 4) if n else 0.0,
+        'color_acc': round(color_ok / color_total, 4) if color_total else None,
+        'images_per_s': round(n / elapsed, 3) if elapsed > 0 else 0.0,
+        'calls_per_image': round(calls / n, 3) if n else 0.0,
+    }
+
+
+def _objectives(r):
+    return (r['plate_acc'], r['color_acc'] if r['color_acc'] is not None else 0.0, r['images_per_s'])
+
+
+# 帕累托前沿：没有其它配置在三项指标上都不差且至少一项更好
+def pareto_front(results):
+    front = []
+    for r in results:
+        a = _objectives(r)
+        dominated = False
+        for other in results:
+            b = _objectives(other)
+            if all(y >= x for x, y in zip(a, b)) and any(y > x for x, y in zip(a, b)):
+                dominated = True
+                break
+        if not dominated:
+            front.append(r)
+    return sorted(front, key=lambda r: (-r['plate_acc'], -r['images_per_s']))
+
+
+def run_sweep(items, configs, workers=1):
+    results = []
+    if workers <= 1:
+        _init_tuner()
+        for i, config in enumerate(configs, 1):
+            results.append(evaluate(config, items))
+            print(f"[{i}/{len(configs)}] {json.dumps(config)}", file=sys.stderr)
+        return results
+    # 各配置在不同进程中并行评估；同时运行的配置数不应超过 CPU 核数，否则吞吐量互相干扰
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_tuner) as executor:
+        futures = [executor.submit(evaluate, config, items) for config in configs]
+        for i, fut in enumerate(as_completed(futures), 1):
+            results.append(fut.result())
+            print(f"[{i}/{len(configs)}] {json.dumps(results[-1]['config'])}", file=sys.stderr)
+    return results
+
+
+def _fmt(r):
+    c = r['config']
+    color = '-' if r['color_acc'] is None else f"{r['color_acc']:.1%}"
+    return (f"车牌 {r['plate_acc']:.1%}  颜色 {color}  {r['images_per_s']:.2f} 张/秒  "
+            f"{r['calls_per_image']:.2f} 次/张  | {json.dumps(c, ensure_ascii=False)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="车牌识别参数调优（准确率 / 吞吐量帕累托前沿）")
+    parser.add_argument('folder', help="带标注的图片文件夹")
+    parser.add_argument('--labels', help=f"标注 CSV（默认 文件夹/{LABELS_FILENAME}）")
+    parser.add_argument('--grid', help="搜索空间 JSON（键同 DEFAULT_GRID，值为候选列表）")
+    parser.add_argument('--max-configs', type=int, help="从网格中随机抽取的配置数（默认全部）")
+    parser.add_argument('--seed', type=int, default=0, help="随机抽取的种子（默认 0）")
+    parser.add_argument('-w', '--workers', type=int, default=1, help="并行评估的进程数（默认 1）")
+    parser.add_argument('-o', '--output', help="全部结果与帕累托前沿的 JSON 输出路径")
+    args = parser.parse_args()
+
+    items = load_labels(args.folder, args.labels)
+    if not items:
+        print("没有可用的标注图片！")
+        sys.exit(2)
+    grid = dict(DEFAULT_GRID)
+    if args.grid:
+        with open(args.grid, encoding='utf-8') as f:
+            grid.update(json.load(f))
+    configs = expand_grid(grid)
+    if args.max_configs and args.max_configs < len(configs):
+        configs = random.Random(args.seed).sample(configs, args.max_configs)
+    print(f"{len(items)} 张标注图片，{len(configs)} 组配置", file=sys.stderr)
+
+    results = run_sweep(items, configs, workers=args.workers)
+    front = pareto_front(results)
+    print('\n帕累托前沿:')
+    for r in front:
+        print('  ' + _fmt(r))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'images': len(items), 'results': results, 'pareto_front': front},
+                      f, ensure_ascii=False, indent=2)
@@ -0,0 +1,182 @@
+import os
+import sys
+import argparse
+import cv2
+
+from plate_recognition import (recognize_image, build_result_row, ScaleScheduler,
+                               SCALE_CONF_THRESHOLD, DEBUG)
+
+# 运动检测在缩小的灰度图上做，宽度越小越快
+MOTION_WIDTH = 160
+# 像素差阈值与运动像素占比阈值
+MOTION_PIXEL_DIFF = 25
+MOTION_RATIO = 0.01
+# 两次检测之间至少间隔的帧数（运动持续时也不必每帧都识别）
+DETECT_STRIDE = 3
+# 最长连续不检测的帧数：画面长时间无变化时也定期送检一次，避免漏掉静止入镜的车辆
+MAX_DETECT_GAP = 50
+# 跟踪：IoU 达到该值视为同一辆车；超过 max_age 帧未再出现即结束该轨迹
+TRACK_IOU = 0.3
+TRACK_MAX_AGE = 30
+
+
+def _bbox_iou(a, b):
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    iw, ih = max(0, ix2 - ix1), max(0, iy2 - iy1)
+    inter = iw * ih
+    if inter == 0:
+        return 0.0
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+    return inter / float(area_a + area_b - inter)
+
+
+class MotionGate:
+    """帧差运动检测：缩小 + 灰度 + 模糊后与上次送检的帧做差，运动像素占比超过阈值即为候选帧。
+    参考帧只在 mark() 时更新，缓慢驶入的车辆逐帧差异虽小，但相对上次送检的画面会累积到阈值。
+    """
+
+    def __init__(self, width=MOTION_WIDTH, pixel_diff=MOTION_PIXEL_DIFF, ratio=MOTION_RATIO):
+        self.width = width
+        self.pixel_diff = pixel_diff
+        self.ratio = ratio
+        self.ref = None
+        self.current = None
+
+    def mark(self):
+        """当前帧已送检：以它作为之后比较的参考帧。"""
+        self.ref = self.current
+
+    def __call__(self, frame):
+        h, w = frame.shape[:2]
+        small_h = max(1, int(h * self.width / float(w)))
+        small = cv2.resize(frame, (self.width, small_h), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        gray = cv2.GaussianBlur(gray, (5, 5), 0)
+        self.current = gray
+        if self.ref is None:
+            return True
+        diff = cv2.absdiff(gray, self.ref)
+        _, diff = cv2.threshold(diff, self.pixel_diff, 255, cv2.THRESH_BINARY)
+        return cv2.countNonZero(diff) >= self.ratio * diff.size
+
+
+class PlateTracker:
+    """按 bbox IoU（或相同车牌号）把各帧识别结果关联成轨迹，每条轨迹只保留置信度最高的一次识别。"""
+
+    def __init__(self, iou=TRACK_IOU, max_age=TRACK_MAX_AGE):
+        self.iou = iou
+        self.max_age = max_age
+        self.tracks = []
+
+    def update(self, frame_idx, det):
+        """det: {'bbox', 'conf', 'plate', 'row'}。同一帧的多块车牌逐块调用，每条轨迹每帧只关联一块。"""
+        best, best_iou = None, 0.0
+        for t in self.tracks:
+            if t['last_frame'] == frame_idx:
+                continue
+            if det['plate'] and det['plate'] == t['best']['plate']:
+                best = t
+                break
+            if det['bbox'] and t['bbox']:
+                iou = _bbox_iou(det['bbox'], t['bbox'])
+                if iou >= self.iou and iou > best_iou:
+                    best, best_iou = t, iou
+        if best is None:
+            best = {'first_frame': frame_idx, 'last_frame': None, 'best': det, 'hits': 0}
+            self.tracks.append(best)
+        elif det['conf'] > best['best']['conf']:
+            best['best'] = det
+        best['bbox'] = det['bbox']
+        best['last_frame'] = frame_idx
+        best['hits'] += 1
+
+    # 结束超时轨迹并返回
+    def expire(self, frame_idx, flush=False):
+        done = [t for t in self.tracks if flush or frame_idx - t['last_frame'] > self.max_age]
+        self.tracks = [t for t in self.tracks if t not in done]
+        return done
+
+
+def _track_row(track, fps):
+    row = dict(track['best']['row'])
+    row['首次出现帧'] = track['first_frame']
+    row['最后出现帧'] = track['last_frame']
+    row['出现时间(秒)'] = round(track['first_frame'] / fps, 2) if fps else None
+    row['识别次数'] = track['hits']
+    return row
+
+
+def iter_video(video_path, conf_threshold=SCALE_CONF_THRESHOLD, detect_stride=DETECT_STRIDE,
+               motion_ratio=MOTION_RATIO, max_gap=MAX_DETECT_GAP, summary=None, options=None):
+    """识别本地视频文件中的车牌，每辆车（每条轨迹，同一帧中的多辆车分别跟踪）产出一行结果，字段同 batch_process，
+    另含帧号、出现时间与识别次数。只有运动候选帧才会送入 HyperLPR；
+    距上次送检超过 max_gap 帧时不论有无运动都强制送检一次。
+    options 为检测选项（同 iter_process，如 {'tiled': True}）；summary 若为 dict，结束时写入总帧数、检测帧数与 HyperLPR 调用次数。
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"无法打开视频: {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    base = os.path.basename(video_path)
+    gate = MotionGate(ratio=motion_ratio)
+    tracker = PlateTracker()
+    scheduler = ScaleScheduler(conf_threshold=conf_threshold)
+    frame_idx = -1
+    last_detect = -detect_stride
+    detected_frames = 0
+    calls = 0
+    try:
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            frame_idx += 1
+            moving = gate(frame)
+            gap = frame_idx - last_detect
+            if (moving and gap >= detect_stride) or gap >= max_gap:
+                last_detect = frame_idx
+                gate.mark()
+                detected_frames += 1
+                stats = {'hyperlpr_calls': 0}
+                name = f"{base}#{frame_idx}"
+                plate, status, color, plate_type = recognize_image(frame, name, scheduler=scheduler,
+                                                                   stats=stats, options=options)
+                calls += stats['hyperlpr_calls']
+                # 同一帧中的每块车牌（每辆车）分别关联轨迹
+                if plate:
+                    for p in stats.get('plates') or []:
+                        row = build_result_row(name, p['plate'], status, p['color'], p['type'])
+                        tracker.update(frame_idx, {'bbox': p['bbox'], 'conf': p['conf'],
+                                                   'plate': p['plate'], 'row': row})
+            for t in tracker.expire(frame_idx):
+                yield _track_row(t, fps)
+        for t in tracker.expire(frame_idx, flush=True):
+            yield _track_row(t, fps)
+    finally:
+        cap.release()
+        if summary is not None:
+            summary.update({'frames': frame_idx + 1, 'detected_frames': detected_frames,
+                            'hyperlpr_calls': calls})
+        if DEBUG:
+            print(f"视频 {base}: 共 {frame_idx + 1} 帧，送检 {detected_frames} 帧，HyperLPR 调用 {calls} 次")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="视频车牌识别（运动门控 + 跨帧跟踪）")
+    parser.add_argument('video', help="本地视频文件路径")
+    parser.add_argument('--stride', type=int, default=DETECT_STRIDE,
+                        help=f"两次检测之间至少间隔的帧数（默认 {DETECT_STRIDE}）")
+    parser.add_argument('--motion-ratio', type=float, default=MOTION_RATIO,
+                        help=f"判定为运动帧的像素占比（默认 {MOTION_RATIO}）")
+    parser.add_argument('--max-gap', type=int, default=MAX_DETECT_GAP,
+                        help=f"无运动时最多间隔多少帧强制检测一次（默认 {MAX_DETECT_GAP}）")
+    args = parser.parse_args()
+    if not os.path.exists(args.video):
+        print("文件不存在")
+        sys.exit(1)
+    for row in iter_video(args.video, detect_stride=args.stride, motion_ratio=args.motion_ratio,
+                          max_gap=args.max_gap):
+        print(f"{row['出现时间(秒)']}s  {row['识别结果']}  {row['车牌颜色']}  {row['车牌类型']}  "
+              f"{row['所属地区']}  (识别 {row['识别次数']} 次)")
@@ -0,0 +1,140 @@
+import os
+import sys
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+
+from calibration import load_calibration, IMAGE_EXTS
+
+# 批量 / 流式畸变矫正：读取 calibration.py 保存的标定结果，
+# 每种分辨率只计算一次 initUndistortRectifyMap（定点 CV_16SC2 映射表），之后每帧只做 cv2.remap。
+# remap 期间 OpenCV 释放 GIL，多线程即可并行。
+#   python undistort.py camera.yaml 图片文件夹 -o 输出文件夹 -t 8
+#   python undistort.py camera.yaml input.mp4 -o output.mp4 --crop
+
+VIDEO_EXTS = ('.mp4', '.avi', '.mkv', '.mov')
+
+
+class Undistorter:
+    """按分辨率缓存映射表。alpha 同 getOptimalNewCameraMatrix（1 保留全部像素，0 只保留有效区域）；
+    crop 为 True 时按有效区域 ROI 裁掉黑边。与标定分辨率不同（同宽高比缩放）的图像按比例缩放内参。"""
+
+    def __init__(self, calib, alpha=1.0, crop=False, interpolation=cv2.INTER_LINEAR):
+        self.mtx = calib['camera_matrix']
+        self.dist = calib['dist_coeffs']
+        self.calib_size = calib['image_size']
+        self.alpha = alpha
+        self.crop = crop
+        self.interpolation = interpolation
+        self.maps = {}
+        self.lock = threading.Lock()
+
+    def _build(self, size):
+        w, h = size
+        mtx = self.mtx.copy()
+        cw, ch = self.calib_size
+        if (cw, ch) != (w, h) and cw and ch:
+            mtx[0] *= w / float(cw)
+            mtx[1] *= h / float(ch)
+        new_mtx, roi = cv2.getOptimalNewCameraMatrix(mtx, self.dist, (w, h), self.alpha, (w, h))
+        map1, map2 = cv2.initUndistortRectifyMap(mtx, self.dist, None, new_mtx, (w, h), cv2.CV_16SC2)
+        return map1, map2, roi
+
+    def maps_for(self, size):
+        entry = self.maps.get(size)
+        if entry is None:
+            with self.lock:
+                entry = self.maps.get(size)
+                if entry is None:
+                    entry = self.maps[size] = self._build(size)
+        return entry
+
+    def apply(self, img):
+        map1, map2, roi = self.maps_for((img.shape[1], img.shape[0]))
+        out = cv2.remap(img, map1, map2, self.interpolation)
+        if self.crop:
+            x, y, w, h = roi
+            if w > 0 and h > 0:
+                out = out[y:y + h, x:x + w]
+        return out
+
+
+def undistort_folder(src_dir, dst_dir, undistorter, threads=None):
+    """矫正文件夹中的全部图片，写到 dst_dir（同名）。读、矫正、写都在线程池中进行，返回处理张数。"""
+    os.makedirs(dst_dir, exist_ok=True)
+    names = sorted(n for n in os.listdir(src_dir) if n.lower().endswith(IMAGE_EXTS))
+
+    def work(name):
+        img = cv2.imread(os.path.join(src_dir, name), cv2.IMREAD_UNCHANGED)
+        if img is None:
+            return False
+        return cv2.imwrite(os.path.join(dst_dir, name), undistorter.apply(img))
+
+    with ThreadPoolExecutor(max_workers=threads or os.cpu_count() or 4) as executor:
+        return sum(executor.map(work, names))
+
+
+def undistort_video(src, dst, undistorter, threads=None):
+    """逐帧矫正视频：读帧与写帧顺序进行，remap 在线程池中并发，在途帧数有上限。返回帧数。"""
+    cap = cv2.VideoCapture(src)
+    if not cap.isOpened():
+        raise IOError(f"无法打开视频：{src}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    threads = threads or os.cpu_count() or 4
+    writer = None
+    frames = 0
+    pending = deque()
+
+    def write(frame):
+        nonlocal writer, frames
+        if writer is None:
+            h, w = frame.shape[:2]
+            writer = cv2.VideoWriter(dst, cv2.VideoWriter_fourcc(*'mp4v'), fps, (w, h))
+        writer.write(frame)
+        frames += 1
+
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            while True:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                pending.append(executor.submit(undistorter.apply, frame))
+                if len(pending) >= threads * 2:
+                    write(pending.popleft().result())
+            while pending:
+                write(pending.popleft().result())
+    finally:
+        cap.release()
+        if writer is not None:
+            writer.release()
+    return frames
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="按标定结果批量矫正图片或视频（预计算映射表 + 多线程 remap）")
+    parser.add_argument('calibration', help="calibration.py -o 保存的标定文件")
+    parser.add_argument('input', help="图片、图片文件夹或视频文件")
+    parser.add_argument('-o', '--output', required=True, help="输出图片 / 文件夹 / 视频路径")
+    parser.add_argument('-t', '--threads', type=int, default=None, help="remap 线程数（默认 CPU 核数）")
+    parser.add_argument('--alpha', type=float, default=1.0,
+                        help="0~1，1 保留全部像素（可能有黑边），0 只保留有效区域（默认 1）")
+    parser.add_argument('--crop', action='store_true', help="按有效区域裁掉黑边")
+    args = parser.parse_args()
+
+    undistorter = Undistorter(load_calibration(args.calibration), alpha=args.alpha, crop=args.crop)
+    if os.path.isdir(args.input):
+        n = undistort_folder(args.input, args.output, undistorter, args.threads)
+        print(f"已矫正 {n} 张图片 -> {args.output}")
+    elif args.input.lower().endswith(VIDEO_EXTS):
+        n = undistort_video(args.input, args.output, undistorter, args.threads)
+        print(f"已矫正 {n} 帧 -> {args.output}")
+    else:
+        img = cv2.imread(args.input, cv2.IMREAD_UNCHANGED)
+        if img is None:
+            print("无法读取图片")
+            sys.exit(1)
+        cv2.imwrite(args.output, undistorter.apply(img))
+        print(f"已矫正 -> {args.output}")
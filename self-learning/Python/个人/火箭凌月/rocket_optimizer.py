@@ -1,10 +1,28 @@
 import numpy as np
 from datetime import timedelta
 import matplotlib.pyplot as plt
-import ephem  # 用于天文坐标转换
 from moon_calculator import MoonCalculator
 from trajectory_loader import TrajectoryLoader
 
+def _time_axis(times):
+    """datetime 列表 -> 微秒整数数组（numpy datetime64 精度）"""
+    return np.asarray(times, dtype='datetime64[us]').astype(np.int64)
+
+
+def _nearest_time_indices(ref_times, query_times):
+    """对每个 query 时刻，返回 ref_times 中最近时刻的下标（距离相同时取较早者）"""
+    ref = _time_axis(ref_times)
+    query = _time_axis(query_times)
+    order = np.argsort(ref, kind='stable')
+    ref_sorted = ref[order]
+    if len(ref_sorted) == 1:
+        return np.zeros(len(query), dtype=np.intp)
+    right = np.clip(np.searchsorted(ref_sorted, query, side='left'), 1, len(ref_sorted) - 1)
+    left = right - 1
+    use_right = np.abs(ref_sorted[right] - query) < np.abs(query - ref_sorted[left])
+    return order[np.where(use_right, right, left)]
+
+
 class RocketLunarTransitOptimizer:
     def __init__(self):
         self.rocket_trajectory = None  # 火箭轨迹（真实数据）
@@ -35,51 +53,43 @@ class RocketLunarTransitOptimizer:
         """
         计算真实凌月时刻：火箭与月球在天球视角重合的时间点
         通过火箭位置（转换为天球坐标）与月球坐标的最小夹角确定
+        全部轨迹点一次性按数组计算：月球位置用 searchsorted 在有序时间轴上取最近时刻，
+        复杂度 O(N log M)，100 Hz 采样的完整上升段也能直接处理
         """
         if not self.rocket_trajectory or not self.moon_ephemeris:
             raise RuntimeError("请先加载火箭轨迹和月球数据")
-        
-        # 转换火箭轨迹为天球坐标（方位角/高度角），以发射场为观测点
-        observer = ephem.Observer()
-        launch_lat = self.rocket_trajectory['lat'][0]
-        launch_lon = self.rocket_trajectory['lon'][0]
-        observer.lat = str(launch_lat)  # ephem需要字符串格式的度数
-        observer.lon = str(launch_lon)
-        
-        min_angle = float('inf')
-        transit_time = None
-        
-        for i, rocket_time in enumerate(self.rocket_trajectory['time']):
-            # 火箭在天球上的坐标（从发射场观测）
-            rocket_lat = self.rocket_trajectory['lat'][i]
-            rocket_lon = self.rocket_trajectory['lon'][i]
-            rocket_alt = self.rocket_trajectory['alt'][i] / 1000  # 转换为千米
-            
-            # 计算火箭方位角（简化为地表投影方位角）
-            d_lon = rocket_lon - launch_lon
-            d_lat = rocket_lat - launch_lat
-            rocket_az = np.degrees(np.arctan2(d_lon, d_lat)) % 360
-            # 计算火箭高度角（基于距离和高度的几何关系）
-            distance_ground = np.hypot(
-                d_lat * 111,  # 纬度每度约111km
-                d_lon * 111 * np.cos(np.radians(launch_lat))  # 经度每度距离与纬度相关
-            )
-            rocket_alt_angle = np.degrees(np.arctan2(rocket_alt, distance_ground))
-            
-            # 查找同时刻的月球位置
-            moon_idx = np.argmin(np.abs(np.array(self.moon_ephemeris['time']) - rocket_time))
-            moon_az = self.moon_ephemeris['azimuth'][moon_idx]
-            moon_alt = self.moon_ephemeris['altitude'][moon_idx]
-            
-            # 计算天球上的角度差（判断是否凌月）
-            angle_diff = np.sqrt((rocket_az - moon_az)**2 + (rocket_alt_angle - moon_alt)** 2)
-            if angle_diff < min_angle:
-                min_angle = angle_diff
-                transit_time = rocket_time
-        
-        if transit_time is None:
+        if len(self.rocket_trajectory['time']) == 0 or len(self.moon_ephemeris['time']) == 0:
             raise RuntimeError("未找到有效的凌月时刻，请检查轨迹时间范围")
-        
+
+        # 以发射场为观测点
+        lat = np.asarray(self.rocket_trajectory['lat'], dtype=np.float64)
+        lon = np.asarray(self.rocket_trajectory['lon'], dtype=np.float64)
+        alt_km = np.asarray(self.rocket_trajectory['alt'], dtype=np.float64) / 1000  # 转换为千米
+        launch_lat = lat[0]
+        launch_lon = lon[0]
+
+        # 火箭方位角（简化为地表投影方位角）
+        d_lon = lon - launch_lon
+        d_lat = lat - launch_lat
+        rocket_az = np.degrees(np.arctan2(d_lon, d_lat)) % 360
+        # 火箭高度角（基于距离和高度的几何关系）
+        distance_ground = np.hypot(
+            d_lat * 111,  # 纬度每度约111km
+            d_lon * 111 * np.cos(np.radians(launch_lat))  # 经度每度距离与纬度相关
+        )
+        rocket_alt_angle = np.degrees(np.arctan2(alt_km, distance_ground))
+
+        # 每个火箭时刻对应的最近月球采样
+        moon_idx = _nearest_time_indices(self.moon_ephemeris['time'], self.rocket_trajectory['time'])
+        moon_az = np.asarray(self.moon_ephemeris['azimuth'], dtype=np.float64)[moon_idx]
+        moon_alt = np.asarray(self.moon_ephemeris['altitude'], dtype=np.float64)[moon_idx]
+
+        # 天球上的角度差（判断是否凌月），取最小者（并列时取最早的轨迹点）
+        angle_diff = np.sqrt((rocket_az - moon_az) ** 2 + (rocket_alt_angle - moon_alt) ** 2)
+        if np.all(np.isnan(angle_diff)):
+            raise RuntimeError("未找到有效的凌月时刻，请检查轨迹时间范围")
+        transit_time = self.rocket_trajectory['time'][int(np.nanargmin(angle_diff))]
+
         self.transit_time = transit_time
         return transit_time
 